@@ -0,0 +1,65 @@
+# benchmarks/captcha_bench.py
+"""Сравнение скорости генерации капчи: старый и текущий алгоритм.
+
+Запуск из корня проекта: python -m benchmarks.captcha_bench [количество]
+"""
+import sys
+import time
+import random
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.captcha import generate_captcha_text, generate_captcha_image
+
+def legacy_captcha_image(text):
+    """Прежний алгоритм: шум по точкам и загрузка шрифта на каждый вызов"""
+    width = 200
+    height = 80
+    image = Image.new('RGB', (width, height), color='white')
+    draw = ImageDraw.Draw(image)
+
+    for _ in range(1000):
+        x = random.randint(0, width)
+        y = random.randint(0, height)
+        draw.point((x, y), fill='gray')
+
+    for _ in range(5):
+        x1 = random.randint(0, width)
+        y1 = random.randint(0, height)
+        x2 = random.randint(0, width)
+        y2 = random.randint(0, height)
+        draw.line([(x1, y1), (x2, y2)], fill='gray', width=1)
+
+    font_size = 45
+    try:
+        font = ImageFont.truetype("arial.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+
+    text_width = font.getlength(text)
+    text_x = (width - text_width) // 2
+    text_y = (height - font_size) // 2
+    draw.text((text_x, text_y), text, font=font, fill='black')
+
+    img_byte_array = BytesIO()
+    image.save(img_byte_array, format='PNG')
+    return img_byte_array.getvalue()
+
+def bench(name, func, texts):
+    started = time.perf_counter()
+    for text in texts:
+        func(text)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>8}: {len(texts) / elapsed:8.1f} img/s ({elapsed / len(texts) * 1000:.2f} ms/img)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    texts = [generate_captcha_text() for _ in range(count)]
+    # Прогрев кэша шрифта и спрайтов
+    generate_captcha_image(texts[0])
+
+    bench("legacy", legacy_captcha_image, texts)
+    bench("current", generate_captcha_image, texts)
+
+if __name__ == '__main__':
+    main()
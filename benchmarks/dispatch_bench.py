@@ -0,0 +1,73 @@
+# benchmarks/dispatch_bench.py
+"""Стоимость маршрутизации текстовых кнопок: F.text-фильтры и реестр кнопок.
+
+Запуск из корня проекта: python -m benchmarks.dispatch_bench [кнопок] [апдейтов]
+"""
+import sys
+import time
+import asyncio
+from datetime import datetime
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.types import Update, Message, Chat, User
+
+from utils.text_commands import TextCommandRegistry
+
+async def noop(message: Message):
+    pass
+
+def make_update(update_id, text):
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=1, type="private"),
+            from_user=User(id=1, is_bot=False, first_name="bench"),
+            text=text
+        )
+    )
+
+def magic_filter_dispatcher(labels):
+    """Прежняя схема: по обработчику с F.text == label на каждую кнопку"""
+    router = Router()
+    for label in labels:
+        router.message(F.text == label)(noop)
+    router.message()(noop)
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+def registry_dispatcher(labels):
+    """Новая схема: один обработчик с поиском по словарю"""
+    registry = TextCommandRegistry()
+    router = Router()
+    for label in labels:
+        registry(router, label)(noop)
+    router.message()(noop)
+    dp = Dispatcher()
+    dp.include_router(registry.router)
+    dp.include_router(router)
+    return dp
+
+async def bench(name, dp, bot, text, count):
+    updates = [make_update(i, text) for i in range(count)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>24}: {elapsed / count * 1e6:8.1f} us/update")
+
+async def main():
+    buttons = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    labels = [f"Кнопка {i}" for i in range(buttons)]
+    # Обработчики ничего не отправляют, поэтому токен не используется
+    bot = Bot("42:BENCHMARK")
+
+    cases = [("last button", labels[-1]), ("first button", labels[0]), ("free text", "просто текст")]
+    for dp_name, dp in (("F.text", magic_filter_dispatcher(labels)), ("registry", registry_dispatcher(labels))):
+        for case_name, text in cases:
+            await bench(f"{dp_name}, {case_name}", dp, bot, text, count)
+
+if __name__ == '__main__':
+    asyncio.run(main())
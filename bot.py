@@ -5,10 +5,7 @@ import signal
 import sys
 import traceback
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from config import BOT_TOKEN
-from handlers import register_all_handlers
-from database import db
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,16 +15,17 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+# Модули бота импортируются и бот создается только внутри main(): при запуске
+# через spawn (Windows) процессы пула капч заново импортируют bot.py как
+# __mp_main__ и не должны открывать базу данных и создавать бота
 
-async def send_channel_notification(username, link):
+async def send_channel_notification(bot, username, link):
     """Отправка уведомления в канал о новой ссылке"""
+    from database import async_db
+
     try:
         # Получаем ID канала из базы данных
-        channel_id = db.get_channel("links")
+        channel_id = await async_db.get_channel("links")
         if not channel_id:
             logger.warning("Links channel not configured")
             return
@@ -47,20 +45,42 @@ class NotificationMiddleware:
     async def __call__(self, handler, event, data):
         result = await handler(event, data)
         if isinstance(result, dict) and 'username' in result and 'link' in result:
-            await send_channel_notification(result['username'], result['link'])
+            await send_channel_notification(data['bot'], result['username'], result['link'])
         return result
 
-async def on_startup():
+async def on_startup(bot):
     """Действия при запуске бота"""
+    from utils.broadcast_jobs import resume_broadcast_jobs
+    from utils.captcha_pool import captcha_pool
+
     logger.info("Бот запущен")
+    
+    # Заполняем пул капч в фоне, чтобы /start не генерировал их в цикле событий
+    captcha_pool.start()
+    
+    # Продолжаем рассылки, прерванные предыдущим завершением
+    await resume_broadcast_jobs(bot)
 
-async def on_shutdown():
+async def on_shutdown(bot):
     """Действия при остановке бота"""
+    from database import async_db
+    from utils.broadcast_jobs import stop_broadcast_jobs
+    from utils.captcha_pool import captcha_pool
+
     logger.info("Завершение работы бота...")
     
+    await captcha_pool.stop()
+    
+    # Результаты рассылок должны попасть в базу до её закрытия,
+    # иначе после перезапуска получатели получат сообщение повторно
+    try:
+        await stop_broadcast_jobs()
+    except Exception as e:
+        logger.error(f"Ошибка при остановке рассылок: {e}")
+    
     # Закрываем подключение к базе данных
     try:
-        db.close()
+        await async_db.close()
         logger.info("Соединение с базой данных закрыто")
     except Exception as e:
         logger.error(f"Ошибка при закрытии соединения с базой данных: {e}")
@@ -73,15 +93,27 @@ async def on_shutdown():
         logger.error(f"Ошибка при закрытии сессии бота: {e}")
 
 async def main():
+    from database import async_db
+    from handlers import register_all_handlers
+    from middlewares import register_all_middlewares
+    from utils.fsm_storage import SQLiteStorage
+
+    # Инициализация бота и диспетчера
+    bot = Bot(token=BOT_TOKEN)
+    # Состояния FSM хранятся в SQLite и переживают перезапуск
+    storage = SQLiteStorage(async_db)
+    dp = Dispatcher(storage=storage)
+
     try:
-        # Регистрация всех обработчиков
+        # Регистрация middleware и всех обработчиков
+        register_all_middlewares(dp, bot)
         register_all_handlers(dp)
         
         # Добавление middleware
         dp.message.middleware.register(NotificationMiddleware())
         
         # Запуск бота
-        await on_startup()
+        await on_startup(bot)
         logger.info("Бот готов к работе!")
         
         # Настройка обработки сигналов для корректного завершения
@@ -103,7 +135,7 @@ async def main():
         logger.error(error_message)
     finally:
         # Выполняем действия при завершении в любом случае
-        await on_shutdown()
+        await on_shutdown(bot)
         logger.info("Бот остановлен")
 
 if __name__ == '__main__':
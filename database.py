@@ -1,69 +1,252 @@
 # Обновление database.py - добавляем поле full_name
 
+import os
+import queue
 import sqlite3
 import logging
+import asyncio
+import threading
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from config import DATABASE_PATH
+from utils.cache import LRUCache, TTLCache, MISSING
+from utils.url_validator import normalize_button_url
 
 logger = logging.getLogger(__name__)
 
+# Профиль SQLite, может быть переопределен через переменные окружения
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "4"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-16000"))  # отрицательное значение - размер в КиБ
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # миллисекунды
+
+# Размер кэша пользователей по Telegram ID
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60"))  # секунд
+
+class ConnectionManager:
+    """Пул соединений SQLite: одно соединение для записи и несколько для чтения.
+
+    В режиме WAL читатели работают со своим снимком базы и не ждут commit
+    писателя, а запись сериализуется блокировкой единственного писателя.
+    """
+
+    def __init__(self, path, readers=SQLITE_READERS, journal_mode=SQLITE_JOURNAL_MODE,
+                 synchronous=SQLITE_SYNCHRONOUS, mmap_size=SQLITE_MMAP_SIZE,
+                 cache_size=SQLITE_CACHE_SIZE, busy_timeout=SQLITE_BUSY_TIMEOUT):
+        self.path = path
+        self.readers = max(1, readers)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+
+        self._writer = self._connect()
+        # Режим журнала хранится в файле базы, достаточно установить его один раз
+        mode = self._writer.execute(f"PRAGMA journal_mode={self.journal_mode}").fetchone()[0]
+        logger.info(f"SQLite journal mode: {mode}")
+        self._writer_lock = threading.RLock()
+
+        self._readers = queue.LifoQueue()
+        self._all_readers = []
+        for _ in range(self.readers):
+            connection = self._connect()
+            self._all_readers.append(connection)
+            self._readers.put(connection)
+
+    def _connect(self):
+        """Открытие соединения с применением профиля PRAGMA"""
+        # Соединения используются из потоков AsyncDatabase, поэтому отключаем проверку потока
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False
+        )
+        connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        connection.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        return connection
+
+    @contextmanager
+    def read(self):
+        """Курсор на свободном соединении для чтения"""
+        connection = self._readers.get()
+        cursor = connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._readers.put(connection)
+
+    @contextmanager
+    def write(self):
+        """Курсор на соединении для записи; commit выполняется при выходе из блока"""
+        with self._writer_lock:
+            cursor = self._writer.cursor()
+            try:
+                yield cursor
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._writer_lock:
+            self._writer.close()
+        for connection in self._all_readers:
+            connection.close()
+
 class Database:
-    def __init__(self):
+    def __init__(self, path=DATABASE_PATH, **pool_options):
         """Инициализация соединения с базой данных"""
-        self.connection = sqlite3.connect(DATABASE_PATH)
-        self.cursor = self.connection.cursor()
+        self.pool = ConnectionManager(path, **pool_options)
+        # Кэш строк пользователей по Telegram ID (включая отрицательные ответы)
+        self.user_cache = LRUCache(USER_CACHE_SIZE)
+        # Короткоживущий кэш агрегатов для /stats
+        self.stats_cache = TTLCache(STATS_CACHE_TTL)
+        # Версия набора кастомных кнопок: растет при каждом изменении, по ней
+        # перестраивается закэшированная основная клавиатура
+        self.buttons_version = 0
         self._create_tables()
         self._migrate_tables()  # Добавляем миграцию
-    
+        self.fts_enabled = self._create_search_index()
+
     # Добавить в database.py в метод _create_tables():
 
     def _create_tables(self):
         """Создание необходимых таблиц, если они не существуют"""
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            telegram_id INTEGER UNIQUE,
-            link TEXT,
-            full_name TEXT
-        )
-        ''')
-        
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channels (
-            id INTEGER PRIMARY KEY,
-            type TEXT NOT NULL,
-            channel_id TEXT NOT NULL
-        )
-        ''')
-        
-        # Новая таблица для кастомных кнопок
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS custom_buttons (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            url TEXT NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            sort_order INTEGER DEFAULT 0
-        )
-        ''')
-        
-        self.connection.commit()
+        with self.pool.write() as cursor:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                telegram_id INTEGER UNIQUE,
+                link TEXT,
+                full_name TEXT,
+                delivery_status TEXT,
+                delivery_status_at TEXT,
+                created_at TEXT
+            )
+            ''')
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS channels (
+                id INTEGER PRIMARY KEY,
+                type TEXT NOT NULL,
+                channel_id TEXT NOT NULL
+            )
+            ''')
+
+            # Новая таблица для кастомных кнопок
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS custom_buttons (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                is_active INTEGER DEFAULT 1,
+                sort_order INTEGER DEFAULT 0,
+                url_normalized TEXT,
+                url_valid INTEGER,
+                url_display_name TEXT
+            )
+            ''')
+
+            # Задания рассылки: ссылка на исходное сообщение и его JSON
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_chat_id INTEGER NOT NULL,
+                from_chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                with_header INTEGER NOT NULL DEFAULT 1,
+                status TEXT NOT NULL DEFAULT 'running',
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                finished_at TEXT
+            )
+            ''')
+
+            # Снимок получателей рассылки и состояние доставки каждому
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                job_id INTEGER NOT NULL,
+                telegram_id INTEGER NOT NULL,
+                user_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (job_id, telegram_id)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status "
+                "ON broadcast_recipients (job_id, status)"
+            )
+
+            # Состояния FSM aiogram (SQLiteStorage); expires_at - unix-время истечения
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires_at ON fsm_storage (expires_at)"
+            )
+
+            # file_id загруженных в Telegram статических файлов по хэшу содержимого
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_cache (
+                file_hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
 
     # Добавить методы для работы с кастомными кнопками в конец класса Database:
 
-    def add_custom_button(self, name, url):
-        """Добавление новой кастомной кнопки"""
+    @staticmethod
+    def _normalize_button_url(url, normalized=None):
+        """(url_normalized, url_valid, url_display_name) для записи в custom_buttons.
+
+        normalized - уже полученный результат normalize_button_url(url), он сохраняется как есть.
+        """
+        if normalized is None:
+            normalized = normalize_button_url(url)
+        normalized_url, valid, display_name = normalized
+        return normalized_url, int(valid), display_name
+
+    def add_custom_button(self, name, url, normalized=None):
+        """Добавление новой кастомной кнопки.
+
+        normalized - результат normalize_button_url(url), если он уже посчитан при проверке ссылки.
+        """
         try:
-            # Получаем максимальный порядок сортировки
-            self.cursor.execute("SELECT MAX(sort_order) FROM custom_buttons")
-            max_order = self.cursor.fetchone()[0] or 0
-            
-            self.cursor.execute(
-                "INSERT INTO custom_buttons (name, url, sort_order) VALUES (?, ?, ?)",
-                (name, url, max_order + 1)
-            )
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                # Получаем максимальный порядок сортировки
+                cursor.execute("SELECT MAX(sort_order) FROM custom_buttons")
+                max_order = cursor.fetchone()[0] or 0
+
+                cursor.execute(
+                    "INSERT INTO custom_buttons "
+                    "(name, url, sort_order, url_normalized, url_valid, url_display_name) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (name, url, max_order + 1, *self._normalize_button_url(url, normalized))
+                )
+            self.buttons_version += 1
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при добавлении кастомной кнопки: {e}")
@@ -72,38 +255,52 @@ class Database:
     def get_custom_buttons(self, active_only=True):
         """Получение списка кастомных кнопок"""
         try:
-            if active_only:
-                self.cursor.execute(
-                    "SELECT id, name, url, is_active FROM custom_buttons WHERE is_active = 1 ORDER BY sort_order"
-                )
-            else:
-                self.cursor.execute(
-                    "SELECT id, name, url, is_active FROM custom_buttons ORDER BY sort_order"
-                )
-            return self.cursor.fetchall()
+            with self.pool.read() as cursor:
+                if active_only:
+                    cursor.execute(
+                        "SELECT id, name, url, is_active FROM custom_buttons WHERE is_active = 1 ORDER BY sort_order"
+                    )
+                else:
+                    cursor.execute(
+                        "SELECT id, name, url, is_active FROM custom_buttons ORDER BY sort_order"
+                    )
+                return cursor.fetchall()
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении кастомных кнопок: {e}")
             return []
 
-    def update_custom_button(self, button_id, name=None, url=None):
-        """Обновление кастомной кнопки"""
+    def get_custom_button_links(self):
+        """Активные кнопки с подготовленными ссылками для обработки нажатий.
+
+        Возвращает кортежи (id, name, url, url_normalized, url_valid, url_display_name).
+        """
         try:
-            if name is not None and url is not None:
-                self.cursor.execute(
-                    "UPDATE custom_buttons SET name = ?, url = ? WHERE id = ?",
-                    (name, url, button_id)
+            with self.pool.read() as cursor:
+                cursor.execute(
+                    "SELECT id, name, url, url_normalized, url_valid, url_display_name "
+                    "FROM custom_buttons WHERE is_active = 1 ORDER BY sort_order"
                 )
-            elif name is not None:
-                self.cursor.execute(
-                    "UPDATE custom_buttons SET name = ? WHERE id = ?",
-                    (name, button_id)
-                )
-            elif url is not None:
-                self.cursor.execute(
-                    "UPDATE custom_buttons SET url = ? WHERE id = ?",
-                    (url, button_id)
-                )
-            self.connection.commit()
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении ссылок кастомных кнопок: {e}")
+            return []
+
+    def update_custom_button(self, button_id, name=None, url=None, normalized=None):
+        """Обновление кастомной кнопки (normalized - как в add_custom_button)"""
+        try:
+            with self.pool.write() as cursor:
+                if name is not None:
+                    cursor.execute(
+                        "UPDATE custom_buttons SET name = ? WHERE id = ?",
+                        (name, button_id)
+                    )
+                if url is not None:
+                    cursor.execute(
+                        "UPDATE custom_buttons SET url = ?, url_normalized = ?, url_valid = ?, "
+                        "url_display_name = ? WHERE id = ?",
+                        (url, *self._normalize_button_url(url, normalized), button_id)
+                    )
+            self.buttons_version += 1
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при обновлении кастомной кнопки: {e}")
@@ -112,11 +309,12 @@ class Database:
     def toggle_custom_button(self, button_id):
         """Переключение активности кастомной кнопки"""
         try:
-            self.cursor.execute(
-                "UPDATE custom_buttons SET is_active = 1 - is_active WHERE id = ?",
-                (button_id,)
-            )
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                cursor.execute(
+                    "UPDATE custom_buttons SET is_active = 1 - is_active WHERE id = ?",
+                    (button_id,)
+                )
+            self.buttons_version += 1
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при переключении кастомной кнопки: {e}")
@@ -125,8 +323,9 @@ class Database:
     def delete_custom_button(self, button_id):
         """Удаление кастомной кнопки"""
         try:
-            self.cursor.execute("DELETE FROM custom_buttons WHERE id = ?", (button_id,))
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                cursor.execute("DELETE FROM custom_buttons WHERE id = ?", (button_id,))
+            self.buttons_version += 1
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при удалении кастомной кнопки: {e}")
@@ -135,133 +334,296 @@ class Database:
     def get_custom_button_by_id(self, button_id):
         """Получение кастомной кнопки по ID"""
         try:
-            self.cursor.execute(
-                "SELECT id, name, url, is_active FROM custom_buttons WHERE id = ?",
-                (button_id,)
-            )
-            return self.cursor.fetchone()
+            with self.pool.read() as cursor:
+                cursor.execute(
+                    "SELECT id, name, url, is_active FROM custom_buttons WHERE id = ?",
+                    (button_id,)
+                )
+                return cursor.fetchone()
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении кастомной кнопки: {e}")
             return None
-    
+
     def _migrate_tables(self):
         """Миграция существующих таблиц"""
         try:
-            # Проверяем, есть ли колонка full_name
-            self.cursor.execute("PRAGMA table_info(users)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-            
-            if 'full_name' not in columns:
-                # Добавляем колонку full_name, если её нет
-                self.cursor.execute("ALTER TABLE users ADD COLUMN full_name TEXT")
-                self.connection.commit()
-                logger.info("Added full_name column to users table")
+            with self.pool.write() as cursor:
+                # Проверяем, есть ли колонка full_name
+                cursor.execute("PRAGMA table_info(users)")
+                columns = [column[1] for column in cursor.fetchall()]
+
+                if 'full_name' not in columns:
+                    # Добавляем колонку full_name, если её нет
+                    cursor.execute("ALTER TABLE users ADD COLUMN full_name TEXT")
+                    logger.info("Added full_name column to users table")
+
+                # Статус доставки: blocked / deactivated / not_found для недоступных чатов
+                if 'delivery_status' not in columns:
+                    cursor.execute("ALTER TABLE users ADD COLUMN delivery_status TEXT")
+                    cursor.execute("ALTER TABLE users ADD COLUMN delivery_status_at TEXT")
+                    logger.info("Added delivery_status columns to users table")
+
+                # Дата регистрации (для старых пользователей неизвестна и остается NULL)
+                if 'created_at' not in columns:
+                    cursor.execute("ALTER TABLE users ADD COLUMN created_at TEXT")
+                    logger.info("Added created_at column to users table")
+
+                # Ссылки кастомных кнопок нормализуются один раз при записи
+                cursor.execute("PRAGMA table_info(custom_buttons)")
+                if 'url_normalized' not in [column[1] for column in cursor.fetchall()]:
+                    cursor.execute("ALTER TABLE custom_buttons ADD COLUMN url_normalized TEXT")
+                    cursor.execute("ALTER TABLE custom_buttons ADD COLUMN url_valid INTEGER")
+                    cursor.execute("ALTER TABLE custom_buttons ADD COLUMN url_display_name TEXT")
+                    logger.info("Added normalized url columns to custom_buttons table")
+                cursor.execute("SELECT id, url FROM custom_buttons WHERE url_normalized IS NULL")
+                backfill = [
+                    (*self._normalize_button_url(url), button_id)
+                    for button_id, url in cursor.fetchall()
+                ]
+                if backfill:
+                    cursor.executemany(
+                        "UPDATE custom_buttons SET url_normalized = ?, url_valid = ?, url_display_name = ? "
+                        "WHERE id = ?",
+                        backfill
+                    )
+                    logger.info(f"Normalized urls of {len(backfill)} custom buttons")
+
+                # Режим рассылки без заголовка
+                cursor.execute("PRAGMA table_info(broadcast_jobs)")
+                if 'with_header' not in [column[1] for column in cursor.fetchall()]:
+                    cursor.execute("ALTER TABLE broadcast_jobs ADD COLUMN with_header INTEGER NOT NULL DEFAULT 1")
+                    logger.info("Added with_header column to broadcast_jobs table")
+
+                # Частичный покрывающий индекс для выборки аудитории рассылки
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_users_audience "
+                    "ON users (telegram_id, delivery_status) WHERE telegram_id IS NOT NULL"
+                )
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_users_created_at "
+                    "ON users (created_at) WHERE created_at IS NOT NULL"
+                )
         except Exception as e:
             logger.error(f"Migration error: {e}")
-    
+
+    def _create_search_index(self):
+        """Полнотекстовый индекс FTS5 по логину, имени и ссылке.
+
+        Индекс хранит только токены (content=users) и синхронизируется
+        триггерами. Если SQLite собран без FTS5, поиск работает через LIKE.
+        """
+        try:
+            with self.pool.write() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'")
+                exists = cursor.fetchone() is not None
+
+                cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                    username, full_name, link,
+                    content='users', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                ''')
+                cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+                    INSERT INTO users_fts (rowid, username, full_name, link)
+                    VALUES (new.id, new.username, new.full_name, new.link);
+                END
+                ''')
+                cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+                    INSERT INTO users_fts (users_fts, rowid, username, full_name, link)
+                    VALUES ('delete', old.id, old.username, old.full_name, old.link);
+                END
+                ''')
+                cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS users_fts_update
+                AFTER UPDATE OF username, full_name, link ON users BEGIN
+                    INSERT INTO users_fts (users_fts, rowid, username, full_name, link)
+                    VALUES ('delete', old.id, old.username, old.full_name, old.link);
+                    INSERT INTO users_fts (rowid, username, full_name, link)
+                    VALUES (new.id, new.username, new.full_name, new.link);
+                END
+                ''')
+
+                # Индекс для уже существующих пользователей
+                if not exists:
+                    cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+                    logger.info("Created users_fts search index")
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 is unavailable, user search falls back to LIKE: {e}")
+            return False
+
     def add_user(self, username, password, full_name=None):
         """Добавление нового пользователя"""
         try:
-            self.cursor.execute(
-                "INSERT INTO users (username, password, full_name) VALUES (?, ?, ?)",
-                (username, password, full_name)
-            )
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                cursor.execute(
+                    "INSERT INTO users (username, password, full_name, created_at) "
+                    "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+                    (username, password, full_name)
+                )
             return True
         except sqlite3.IntegrityError:
             logger.error(f"Пользователь {username} уже существует")
             return False
-    
+
     def authenticate_user(self, username, password):
         """Проверка учетных данных пользователя"""
-        self.cursor.execute(
-            "SELECT id FROM users WHERE username = ? AND password = ?",
-            (username, password)
-        )
-        user = self.cursor.fetchone()
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT id FROM users WHERE username = ? AND password = ?",
+                (username, password)
+            )
+            user = cursor.fetchone()
         return user[0] if user else None
-    
+
+    def _get_telegram_id(self, cursor, user_id):
+        """Текущий Telegram ID пользователя для инвалидации кэша"""
+        cursor.execute("SELECT telegram_id FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
     def update_telegram_id(self, user_id, telegram_id, full_name=None):
         """Обновление Telegram ID и полного имени пользователя"""
-        if full_name:
-            self.cursor.execute(
-                "UPDATE users SET telegram_id = ?, full_name = ? WHERE id = ?",
-                (telegram_id, full_name, user_id)
-            )
-        else:
-            self.cursor.execute(
-                "UPDATE users SET telegram_id = ? WHERE id = ?",
-                (telegram_id, user_id)
-            )
-        self.connection.commit()
-    
+        with self.pool.write() as cursor:
+            old_telegram_id = self._get_telegram_id(cursor, user_id)
+            # Новая привязка означает, что чат снова доступен для рассылок
+            if full_name:
+                cursor.execute(
+                    "UPDATE users SET telegram_id = ?, full_name = ?, "
+                    "delivery_status = NULL, delivery_status_at = NULL WHERE id = ?",
+                    (telegram_id, full_name, user_id)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE users SET telegram_id = ?, "
+                    "delivery_status = NULL, delivery_status_at = NULL WHERE id = ?",
+                    (telegram_id, user_id)
+                )
+        self.user_cache.invalidate(old_telegram_id, telegram_id)
+
     def get_user_by_telegram_id(self, telegram_id):
         """Получение информации о пользователе по Telegram ID"""
-        self.cursor.execute(
-            "SELECT id, username, link, full_name FROM users WHERE telegram_id = ?",
-            (telegram_id,)
-        )
-        result = self.cursor.fetchone()
+        cached = self.user_cache.get(telegram_id)
+        if cached is not MISSING:
+            return cached
+
+        generation = self.user_cache.generation
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT id, username, link, full_name FROM users WHERE telegram_id = ?",
+                (telegram_id,)
+            )
+            result = cursor.fetchone()
         # Обеспечиваем обратную совместимость: если full_name NULL, возвращаем только первые 3 поля
         if result and result[3] is None:
-            return result[:3]  # (id, username, link)
-        return result  # (id, username, link, full_name) или None
-    
+            result = result[:3]  # (id, username, link)
+        # (id, username, link, full_name) или None
+        self.user_cache.put(telegram_id, result, generation)
+        return result
+
     def get_user_by_username(self, username):
         """Получение информации о пользователе по имени пользователя"""
-        self.cursor.execute(
-            "SELECT id, password, telegram_id, link, full_name FROM users WHERE username = ?",
-            (username,)
-        )
-        return self.cursor.fetchone()
-    
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT id, password, telegram_id, link, full_name FROM users WHERE username = ?",
+                (username,)
+            )
+            return cursor.fetchone()
+
     def update_link(self, user_id, link):
         """Обновление ссылки пользователя"""
-        self.cursor.execute(
-            "UPDATE users SET link = ? WHERE id = ?",
-            (link, user_id)
-        )
-        self.connection.commit()
-    
+        with self.pool.write() as cursor:
+            telegram_id = self._get_telegram_id(cursor, user_id)
+            cursor.execute(
+                "UPDATE users SET link = ? WHERE id = ?",
+                (link, user_id)
+            )
+        self.user_cache.invalidate(telegram_id)
+
     def get_all_users(self):
         """Получение списка всех пользователей для админа"""
         try:
-            # Проверяем, есть ли колонка full_name
-            self.cursor.execute("PRAGMA table_info(users)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-            
-            if 'full_name' in columns:
-                # Если колонка есть, выбираем все поля включая full_name
-                self.cursor.execute("SELECT id, username, telegram_id, link, full_name FROM users")
-            else:
-                # Если колонки нет, выбираем только старые поля
-                self.cursor.execute("SELECT id, username, telegram_id, link FROM users")
-            
-            return self.cursor.fetchall()
+            with self.pool.read() as cursor:
+                # Проверяем, есть ли колонка full_name
+                cursor.execute("PRAGMA table_info(users)")
+                columns = [column[1] for column in cursor.fetchall()]
+
+                if 'full_name' in columns:
+                    # Если колонка есть, выбираем все поля включая full_name
+                    cursor.execute("SELECT id, username, telegram_id, link, full_name FROM users")
+                else:
+                    # Если колонки нет, выбираем только старые поля
+                    cursor.execute("SELECT id, username, telegram_id, link FROM users")
+
+                return cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting all users: {e}")
             # Fallback to old query format
-            self.cursor.execute("SELECT id, username, telegram_id, link FROM users")
-            return self.cursor.fetchall()
-    
+            with self.pool.read() as cursor:
+                cursor.execute("SELECT id, username, telegram_id, link FROM users")
+                return cursor.fetchall()
+
+    def get_users_page(self, after_id=None, before_id=None, last=False, limit=10):
+        """Страница списка пользователей для админа (keyset-пагинация по id).
+
+        after_id - следующая страница, before_id - предыдущая, last - последняя,
+        без параметров - первая. Возвращает (rows, has_prev, has_next), где rows -
+        кортежи (id, username, password, telegram_id, link, full_name) по возрастанию id.
+        """
+        columns = "SELECT id, username, password, telegram_id, link, full_name FROM users"
+        try:
+            with self.pool.read() as cursor:
+                if after_id is not None:
+                    cursor.execute(f"{columns} WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+                    rows = cursor.fetchall()
+                elif before_id is not None:
+                    cursor.execute(f"{columns} WHERE id < ? ORDER BY id DESC LIMIT ?", (before_id, limit))
+                    rows = cursor.fetchall()[::-1]
+                elif last:
+                    cursor.execute(f"{columns} ORDER BY id DESC LIMIT ?", (limit,))
+                    rows = cursor.fetchall()[::-1]
+                else:
+                    cursor.execute(f"{columns} ORDER BY id LIMIT ?", (limit,))
+                    rows = cursor.fetchall()
+
+                if not rows:
+                    return [], False, False
+
+                # Соседние страницы проверяются по первичному ключу, без подсчета всей таблицы
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM users WHERE id < ?)", (rows[0][0],))
+                has_prev = bool(cursor.fetchone()[0])
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM users WHERE id > ?)", (rows[-1][0],))
+                has_next = bool(cursor.fetchone()[0])
+                return rows, has_prev, has_next
+        except Exception as e:
+            logger.error(f"Error getting users page: {e}")
+            return [], False, False
+
     def delete_user(self, user_id):
         """Удаление пользователя"""
         try:
-            self.cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                telegram_id = self._get_telegram_id(cursor, user_id)
+                cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            self.user_cache.invalidate(telegram_id)
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при удалении пользователя: {e}")
             return False
-    
+
     def update_username(self, user_id, new_username):
         """Изменение логина пользователя"""
         try:
-            self.cursor.execute(
-                "UPDATE users SET username = ? WHERE id = ?",
-                (new_username, user_id)
-            )
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                telegram_id = self._get_telegram_id(cursor, user_id)
+                cursor.execute(
+                    "UPDATE users SET username = ? WHERE id = ?",
+                    (new_username, user_id)
+                )
+            self.user_cache.invalidate(telegram_id)
             return True
         except sqlite3.IntegrityError:
             logger.error(f"Пользователь с логином {new_username} уже существует")
@@ -269,70 +631,122 @@ class Database:
         except sqlite3.Error as e:
             logger.error(f"Ошибка при изменении логина: {e}")
             return False
-    
+
     def update_password(self, user_id, new_password):
         """Изменение пароля пользователя"""
         try:
-            self.cursor.execute(
-                "UPDATE users SET password = ? WHERE id = ?",
-                (new_password, user_id)
-            )
-            self.connection.commit()
+            with self.pool.write() as cursor:
+                cursor.execute(
+                    "UPDATE users SET password = ? WHERE id = ?",
+                    (new_password, user_id)
+                )
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при изменении пароля: {e}")
             return False
-    
+
     def get_user_by_id(self, user_id):
         """Получение информации о пользователе по ID"""
-        self.cursor.execute(
-            "SELECT username, telegram_id, link, full_name FROM users WHERE id = ?",
-            (user_id,)
-        )
-        result = self.cursor.fetchone()
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT username, telegram_id, link, full_name FROM users WHERE id = ?",
+                (user_id,)
+            )
+            result = cursor.fetchone()
         # Обеспечиваем обратную совместимость: если full_name NULL, возвращаем только первые 3 поля
         if result and result[3] is None:
             return result[:3]  # (username, telegram_id, link)
         return result  # (username, telegram_id, link, full_name) или None
-        
+
+    def get_fsm_record(self, key):
+        """Состояние FSM по ключу: (state, data_json, expires_at) или None"""
+        with self.pool.read() as cursor:
+            cursor.execute("SELECT state, data, expires_at FROM fsm_storage WHERE key = ?", (key,))
+            return cursor.fetchone()
+
+    def save_fsm_records(self, records, deleted_keys):
+        """Запись пачки состояний FSM одной транзакцией.
+
+        records - кортежи (key, state, data_json, expires_at), deleted_keys - ключи
+        очищенных состояний.
+        """
+        with self.pool.write() as cursor:
+            if records:
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO fsm_storage (key, state, data, expires_at) VALUES (?, ?, ?, ?)",
+                    records
+                )
+            if deleted_keys:
+                cursor.executemany(
+                    "DELETE FROM fsm_storage WHERE key = ?",
+                    [(key,) for key in deleted_keys]
+                )
+
+    def delete_expired_fsm_records(self, now):
+        """Удаление брошенных состояний FSM, возвращает их количество"""
+        with self.pool.write() as cursor:
+            cursor.execute("DELETE FROM fsm_storage WHERE expires_at <= ?", (now,))
+            return cursor.rowcount
+
+    def get_media_file_id(self, file_hash):
+        """file_id ранее загруженного файла по хэшу содержимого"""
+        with self.pool.read() as cursor:
+            cursor.execute("SELECT file_id FROM media_cache WHERE file_hash = ?", (file_hash,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def set_media_file_id(self, file_hash, path, file_id):
+        """Сохранение file_id загруженного файла"""
+        with self.pool.write() as cursor:
+            cursor.execute(
+                "INSERT OR REPLACE INTO media_cache (file_hash, path, file_id, updated_at) "
+                "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+                (file_hash, path, file_id)
+            )
+
+    def delete_media_file_id(self, file_hash):
+        """Удаление недействительного file_id"""
+        with self.pool.write() as cursor:
+            cursor.execute("DELETE FROM media_cache WHERE file_hash = ?", (file_hash,))
+
     # Заменить метод set_channel в database.py:
 
     def set_channel(self, channel_type, channel_id):
         """Установка или обновление канала определенного типа"""
         try:
-            # Сначала проверяем, есть ли уже запись с таким типом
-            self.cursor.execute(
-                "SELECT id FROM channels WHERE type = ?",
-                (channel_type,)
-            )
-            existing = self.cursor.fetchone()
-            
-            if existing:
-                # Если запись существует, обновляем её
-                self.cursor.execute(
-                    "UPDATE channels SET channel_id = ? WHERE type = ?",
-                    (channel_id, channel_type)
-                )
-                logger.info(f"Updated channel {channel_type} to {channel_id}")
-            else:
-                # Если записи нет, создаём новую
-                self.cursor.execute(
-                    "INSERT INTO channels (type, channel_id) VALUES (?, ?)",
-                    (channel_type, channel_id)
+            with self.pool.write() as cursor:
+                # Сначала проверяем, есть ли уже запись с таким типом
+                cursor.execute(
+                    "SELECT id FROM channels WHERE type = ?",
+                    (channel_type,)
                 )
-                logger.info(f"Inserted new channel {channel_type} with {channel_id}")
-            
-            self.connection.commit()
-            
+                existing = cursor.fetchone()
+
+                if existing:
+                    # Если запись существует, обновляем её
+                    cursor.execute(
+                        "UPDATE channels SET channel_id = ? WHERE type = ?",
+                        (channel_id, channel_type)
+                    )
+                    logger.info(f"Updated channel {channel_type} to {channel_id}")
+                else:
+                    # Если записи нет, создаём новую
+                    cursor.execute(
+                        "INSERT INTO channels (type, channel_id) VALUES (?, ?)",
+                        (channel_type, channel_id)
+                    )
+                    logger.info(f"Inserted new channel {channel_type} with {channel_id}")
+
             # Проверяем, что изменения применились
-            self.cursor.execute(
-                "SELECT channel_id FROM channels WHERE type = ?",
-                (channel_type,)
-            )
-            result = self.cursor.fetchone()
+            with self.pool.read() as cursor:
+                cursor.execute(
+                    "SELECT channel_id FROM channels WHERE type = ?",
+                    (channel_type,)
+                )
+                result = cursor.fetchone()
             saved_id = result[0] if result else None
             logger.info(f"Verification: channel {channel_type} now has ID {saved_id}")
-            
+
             return True
         except sqlite3.Error as e:
             logger.error(f"Ошибка при установке канала: {e}")
@@ -341,19 +755,363 @@ class Database:
     def get_channel(self, channel_type):
         """Получение ID канала по типу"""
         try:
-            self.cursor.execute(
-                "SELECT channel_id FROM channels WHERE type = ?",
-                (channel_type,)
-            )
-            result = self.cursor.fetchone()
+            with self.pool.read() as cursor:
+                cursor.execute(
+                    "SELECT channel_id FROM channels WHERE type = ?",
+                    (channel_type,)
+                )
+                result = cursor.fetchone()
             return result[0] if result else None
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении канала: {e}")
             return None
 
+    def iter_broadcast_audience(self, exclude_telegram_id=None, authorized_only=True,
+                                with_link=False, skip_blocked=True, batch_size=500):
+        """Потоковая выборка аудитории рассылки (user_id, telegram_id).
+
+        Строки читаются пачками по batch_size, поэтому большая аудитория
+        не загружается в память целиком.
+        """
+        conditions = []
+        params = []
+        if authorized_only:
+            conditions.append("telegram_id IS NOT NULL")
+        if skip_blocked:
+            conditions.append("delivery_status IS NULL")
+        if with_link:
+            conditions.append("link IS NOT NULL AND link != ''")
+        if exclude_telegram_id is not None:
+            conditions.append("telegram_id != ?")
+            params.append(exclude_telegram_id)
+
+        query = "SELECT id, telegram_id FROM users"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        with self.pool.read() as cursor:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def search_users(self, query, limit=20):
+        """Поиск пользователей по логину, имени, ссылке и ID.
+
+        Числовой запрос также сравнивается с id и telegram_id. Результаты
+        FTS5 ранжируются по bm25. Возвращает кортежи
+        (id, username, telegram_id, link, full_name).
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        columns = "SELECT u.id, u.username, u.telegram_id, u.link, u.full_name FROM users u"
+        results = []
+        with self.pool.read() as cursor:
+            # isdigit() пропускает надстрочные цифры вроде "²", поэтому разбираем через int()
+            try:
+                number = int(query)
+            except ValueError:
+                number = None
+            # Значения вне 64-битного INTEGER SQLite не хранит
+            if number is not None and -2 ** 63 <= number < 2 ** 63:
+                cursor.execute(
+                    f"{columns} WHERE u.id = ? OR u.telegram_id = ? LIMIT ?",
+                    (number, number, limit)
+                )
+                results.extend(cursor.fetchall())
+
+            if self.fts_enabled:
+                # Каждое слово ищется как префикс, кавычки экранируются удвоением
+                terms = " ".join('"' + term.replace('"', '""') + '"*' for term in query.split())
+                cursor.execute(
+                    f"{columns} JOIN users_fts ON users_fts.rowid = u.id "
+                    "WHERE users_fts MATCH ? ORDER BY bm25(users_fts) LIMIT ?",
+                    (terms, limit)
+                )
+            else:
+                pattern = f"%{query}%"
+                cursor.execute(
+                    f"{columns} WHERE u.username LIKE ? OR u.full_name LIKE ? OR u.link LIKE ? "
+                    "ORDER BY u.id LIMIT ?",
+                    (pattern, pattern, pattern, limit)
+                )
+            found = {row[0] for row in results}
+            results.extend(row for row in cursor.fetchall() if row[0] not in found)
+
+        return results[:limit]
+
+    def get_user_stats(self, days=7):
+        """Сводная статистика пользователей, считается агрегатами SQL.
+
+        Результат кэшируется на STATS_CACHE_TTL секунд. registrations - список
+        (дата, количество) за последние days дней по дате регистрации (UTC).
+        """
+        cached = self.stats_cache.get(days)
+        if cached is not MISSING:
+            return cached
+
+        with self.pool.read() as cursor:
+            cursor.execute('''
+            SELECT
+                COUNT(*),
+                COUNT(telegram_id),
+                COALESCE(SUM(link IS NOT NULL AND link != ''), 0),
+                COALESCE(SUM(delivery_status IS NOT NULL), 0)
+            FROM users
+            ''')
+            total, authorized, with_link, unreachable = cursor.fetchone()
+            cursor.execute(
+                "SELECT date(created_at) AS day, COUNT(*) FROM users "
+                "WHERE created_at >= date('now', ?) GROUP BY day ORDER BY day",
+                (f"-{days - 1} days",)
+            )
+            registrations = cursor.fetchall()
+
+        stats = {
+            "total": total,
+            "authorized": authorized,
+            "unauthorized": total - authorized,
+            "with_link": with_link,
+            "unreachable": unreachable,
+            "registrations": registrations,
+        }
+        self.stats_cache.put(days, stats)
+        return stats
+
+    def iter_users_for_export(self, batch_size=500):
+        """Потоковая выборка всех пользователей для выгрузки в файл"""
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT id, username, password, telegram_id, link, full_name, delivery_status "
+                "FROM users ORDER BY id"
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def set_delivery_status(self, telegram_id, status):
+        """Отметка недоступного чата (бот заблокирован, аккаунт удален, чат не найден)"""
+        with self.pool.write() as cursor:
+            cursor.execute(
+                "UPDATE users SET delivery_status = ?, delivery_status_at = CURRENT_TIMESTAMP "
+                "WHERE telegram_id = ?",
+                (status, telegram_id)
+            )
+
+    def get_unreachable_users(self, limit=50):
+        """Пользователи с недоступными чатами и их общее количество"""
+        with self.pool.read() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM users WHERE delivery_status IS NOT NULL")
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT id, username, telegram_id, delivery_status, delivery_status_at FROM users "
+                "WHERE delivery_status IS NOT NULL ORDER BY delivery_status_at DESC LIMIT ?",
+                (limit,)
+            )
+            return total, cursor.fetchall()
+
+    def reset_delivery_status(self, user_id=None):
+        """Сброс статуса доставки одного или всех пользователей"""
+        with self.pool.write() as cursor:
+            if user_id is None:
+                cursor.execute(
+                    "UPDATE users SET delivery_status = NULL, delivery_status_at = NULL "
+                    "WHERE delivery_status IS NOT NULL"
+                )
+            else:
+                cursor.execute(
+                    "UPDATE users SET delivery_status = NULL, delivery_status_at = NULL "
+                    "WHERE id = ? AND delivery_status IS NOT NULL",
+                    (user_id,)
+                )
+            return cursor.rowcount
+
+    def create_broadcast_job(self, admin_chat_id, from_chat_id, message_id, payload, recipients=None,
+                             with_header=True, **audience):
+        """Создание задания рассылки со снимком получателей [(user_id, telegram_id), ...].
+
+        Если recipients не переданы, снимок берется из iter_broadcast_audience(**audience).
+        """
+        if recipients is None:
+            recipients = self.iter_broadcast_audience(**audience)
+        with self.pool.write() as cursor:
+            cursor.execute(
+                "INSERT INTO broadcast_jobs (admin_chat_id, from_chat_id, message_id, payload, with_header) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (admin_chat_id, from_chat_id, message_id, payload, int(with_header))
+            )
+            job_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT OR IGNORE INTO broadcast_recipients (job_id, user_id, telegram_id) VALUES (?, ?, ?)",
+                ((job_id, user_id, telegram_id) for user_id, telegram_id in recipients)
+            )
+        return job_id
+
+    def get_broadcast_job(self, job_id):
+        """Получение задания рассылки по ID"""
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT id, admin_chat_id, from_chat_id, message_id, payload, status, with_header "
+                "FROM broadcast_jobs WHERE id = ?",
+                (job_id,)
+            )
+            return cursor.fetchone()
+
+    def get_unfinished_broadcast_jobs(self):
+        """ID заданий рассылки, прерванных до завершения"""
+        with self.pool.read() as cursor:
+            cursor.execute("SELECT id FROM broadcast_jobs WHERE status = 'running' ORDER BY id")
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_pending_broadcast_recipients(self, job_id):
+        """Telegram ID получателей, которым сообщение еще не отправлялось"""
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT telegram_id FROM broadcast_recipients WHERE job_id = ? AND status = 'pending'",
+                (job_id,)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def set_broadcast_recipient_status(self, job_id, telegram_id, status, error=None):
+        """Сохранение результата доставки одному получателю"""
+        with self.pool.write() as cursor:
+            cursor.execute(
+                "UPDATE broadcast_recipients "
+                "SET status = ?, error = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP "
+                "WHERE job_id = ? AND telegram_id = ?",
+                (status, error, job_id, telegram_id)
+            )
+
+    def save_broadcast_results(self, job_id, results):
+        """Сохранение пачки результатов доставки одной транзакцией.
+
+        results - кортежи (telegram_id, status, error, delivery_status); delivery_status,
+        если задан, отмечает недоступный чат пользователя (см. set_delivery_status).
+        """
+        with self.pool.write() as cursor:
+            cursor.executemany(
+                "UPDATE broadcast_recipients "
+                "SET status = ?, error = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP "
+                "WHERE job_id = ? AND telegram_id = ?",
+                ((status, error, job_id, telegram_id) for telegram_id, status, error, _ in results)
+            )
+            cursor.executemany(
+                "UPDATE users SET delivery_status = ?, delivery_status_at = CURRENT_TIMESTAMP "
+                "WHERE telegram_id = ?",
+                ((delivery_status, telegram_id) for telegram_id, _, _, delivery_status in results
+                 if delivery_status)
+            )
+
+    def get_broadcast_job_stats(self, job_id):
+        """Количество получателей задания по статусам"""
+        with self.pool.read() as cursor:
+            cursor.execute(
+                "SELECT status, COUNT(*) FROM broadcast_recipients WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            )
+            return dict(cursor.fetchall())
+
+    def set_broadcast_job_status(self, job_id, status):
+        """Изменение статуса задания рассылки"""
+        with self.pool.write() as cursor:
+            cursor.execute(
+                "UPDATE broadcast_jobs SET status = ?, "
+                "finished_at = CASE WHEN ? = 'done' THEN CURRENT_TIMESTAMP ELSE NULL END "
+                "WHERE id = ?",
+                (status, status, job_id)
+            )
+
+    def reset_failed_broadcast_recipients(self, job_id):
+        """Возврат недоставленных получателей в очередь для повторной попытки.
+
+        Пользователи с недоступным чатом (delivery_status) в очередь не возвращаются.
+        """
+        with self.pool.write() as cursor:
+            cursor.execute(
+                "UPDATE broadcast_recipients SET status = 'pending' "
+                "WHERE job_id = ? AND status = 'failed' AND NOT EXISTS ("
+                "SELECT 1 FROM users WHERE users.telegram_id = broadcast_recipients.telegram_id "
+                "AND users.delivery_status IS NOT NULL)",
+                (job_id,)
+            )
+            return cursor.rowcount
+
     def close(self):
         """Закрытие соединения с базой данных"""
-        self.connection.close()
+        self.pool.close()
+
+class AsyncDatabase:
+    """Асинхронная обёртка над Database с тем же набором методов.
+
+    Чтения выполняются в пуле потоков по числу соединений для чтения, а записи -
+    в отдельном единственном потоке: записи все равно сериализуются блокировкой
+    писателя, и ожидающие commit вызовы не занимают потоки, нужные чтениям.
+    Медленный commit не блокирует ни цикл событий aiogram, ни параллельные чтения.
+    """
+
+    # Методы Database с такими префиксами берут соединение для записи
+    WRITE_PREFIXES = ("add_", "update_", "set_", "delete_", "reset_", "create_", "toggle_", "save_")
+
+    def __init__(self, database, max_workers=None):
+        self._db = database
+        if max_workers is None:
+            max_workers = database.pool.readers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение произвольной синхронной функции в потоке чтения базы данных"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_write(self, func, *args, **kwargs):
+        """Выполнение синхронной функции в потоке записи базы данных"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._write_executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        run = self.run_write if name.startswith(self.WRITE_PREFIXES) else self.run
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await run(attr, *args, **kwargs)
+
+        # Кэшируем обёртку, чтобы не создавать её при каждом вызове
+        setattr(self, name, method)
+        return method
+
+    async def get_user_by_telegram_id(self, telegram_id):
+        """Получение пользователя по Telegram ID; попадание в кэш обходится без потока"""
+        cached = self._db.user_cache.get(telegram_id)
+        if cached is not MISSING:
+            return cached
+        return await self.run(self._db.get_user_by_telegram_id, telegram_id)
+
+    async def close(self):
+        """Закрытие соединений и остановка потоков базы данных"""
+        # Сначала дожидаемся записей из очереди, затем закрываем соединения
+        self._write_executor.shutdown(wait=True)
+        await self.run(self._db.close)
+        self._executor.shutdown(wait=True)
 
 # Создаем глобальный экземпляр базы данных для использования во всем приложении
-db = Database()
\ No newline at end of file
+db = Database()
+
+# Асинхронный доступ к той же базе для обработчиков
+async_db = AsyncDatabase(db)
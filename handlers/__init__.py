@@ -1,10 +1,14 @@
 # handlers/__init__.py
 from . import auth, admin, user
+from utils.text_commands import text_command
 
 def register_all_handlers(dp):
     """Регистрация всех обработчиков в правильном порядке"""
     # Порядок регистрации ОЧЕНЬ важен!
     
+    # 0. Кнопки обычной клавиатуры вне состояний FSM - один поиск в словаре
+    dp.include_router(text_command.router)
+    
     # 1. Сначала авторизация (самый высокий приоритет)
     auth.setup(dp)
     
@@ -1,12 +1,16 @@
 from aiogram import Router, F, Bot, Dispatcher
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from config import get_welcome_message, update_welcome_message
 from models import BroadcastByIdStates, ChannelStates, CustomButtonStates
-from database import db
+from database import async_db, db
 from models import AddUserStates, EditUserStates, DeleteUserStates, BroadcastStates, WelcomeMessageStates
-from utils.url_validator import validate_and_fix_url, is_valid_url, get_url_display_name
+from utils.url_validator import normalize_button_url
+from utils.broadcast_jobs import create_broadcast_job, run_broadcast_job, retry_broadcast_job
+from utils.albums import album_collector
+from utils.export import export_users_csv_gz, export_users_xlsx, xlsx_available
 
 from utils.keyboards import (
     get_admin_keyboard, 
@@ -16,8 +20,10 @@ from utils.keyboards import (
     get_main_keyboard,
     get_start_keyboard,
     get_button_management_keyboard,
-    get_button_edit_keyboard
+    get_button_edit_keyboard,
+    get_users_page_keyboard
 )
+from utils.text_commands import text_command
 from utils.helpers import (
     check_admin,
     cancel_state,
@@ -26,11 +32,16 @@ from utils.helpers import (
     send_success_message
 )
 
-import asyncio
+import os
 import logging
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Пользователей на одной странице списка /admin
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "10"))
+MAX_MESSAGE_LENGTH = 4096
+
 router = Router()
 # Заменить функцию get_channel_name и обработчики кнопок каналов в handlers/admin.py:
 
@@ -48,14 +59,14 @@ async def get_channel_info(bot: Bot, channel_id: str) -> str:
         logger.error(f"Failed to get channel info for {channel_id}: {e}")
         return f"ID: {channel_id}"
 
-@router.message(F.text == "📋 Канал для ссылок")
+@text_command(router, "📋 Канал для ссылок")
 async def cmd_set_links_channel(message: Message, state: FSMContext, bot: Bot):
     """Обработчик команды установки канала для ссылок"""
     if not await check_admin(message):
         return
 
     # Получаем свежий ID канала из базы данных
-    current_channel_id = db.get_channel("links")
+    current_channel_id = await async_db.get_channel("links")
     if current_channel_id:
         current_status = await get_channel_info(bot, current_channel_id)
     else:
@@ -70,14 +81,14 @@ async def cmd_set_links_channel(message: Message, state: FSMContext, bot: Bot):
     await state.update_data(channel_type="links")
     await state.set_state(ChannelStates.waiting_for_channel_id)
 
-@router.message(F.text == "💬 Канал для сообщений")
+@text_command(router, "💬 Канал для сообщений")
 async def cmd_set_messages_channel(message: Message, state: FSMContext, bot: Bot):
     """Обработчик команды установки канала для сообщений"""
     if not await check_admin(message):
         return
 
     # Получаем свежий ID канала из базы данных
-    current_channel_id = db.get_channel("messages")
+    current_channel_id = await async_db.get_channel("messages")
     if current_channel_id:
         current_status = await get_channel_info(bot, current_channel_id)
     else:
@@ -94,9 +105,9 @@ async def cmd_set_messages_channel(message: Message, state: FSMContext, bot: Bot
 # Добавить этот обработчик в handlers/admin.py после существующих обработчиков каналов:
 
 @router.message(ChannelStates.waiting_for_channel_id)
-async def process_channel_id(message: Message, state: FSMContext, bot: Bot):
+async def process_channel_id(message: Message, state: FSMContext, bot: Bot, current_user: tuple | None, is_admin: bool):
     """Обработка ввода ID канала"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
 
     channel_id = message.text.strip()
@@ -115,12 +126,12 @@ async def process_channel_id(message: Message, state: FSMContext, bot: Bot):
         await test_message.delete()
 
         # Сохраняем ID канала в базе данных
-        save_result = db.set_channel(channel_type, channel_id)
+        save_result = await async_db.set_channel(channel_type, channel_id)
         logger.info(f"Channel save result: {save_result}")
         
         if save_result:
             # Проверяем, что канал действительно сохранился
-            saved_channel = db.get_channel(channel_type)
+            saved_channel = await async_db.get_channel(channel_type)
             logger.info(f"Saved channel ID: {saved_channel}")
             
             channel_type_text = "ссылок" if channel_type == "links" else "сообщений"
@@ -176,7 +187,7 @@ def get_display_name_from_user_info(user_info, username):
 
 # Обновленная функция для отображения списка пользователей с именами
 
-@router.message(F.text == "📩 Сообщение")
+@text_command(router, "📩 Сообщение")
 @router.message(Command("broadcast_by_id"))
 async def cmd_broadcast_by_id(message: Message, state: FSMContext):
     """Обработчик команды /broadcast_by_id для начала рассылки по ID"""
@@ -184,7 +195,7 @@ async def cmd_broadcast_by_id(message: Message, state: FSMContext):
         return
     
     # Получаем список всех пользователей
-    users = db.get_all_users()
+    users = await async_db.get_all_users()
     if not users:
         await send_error_message(message, "Список пользователей пуст.", reply_markup=get_admin_keyboard())
         return
@@ -219,9 +230,9 @@ async def cmd_broadcast_by_id(message: Message, state: FSMContext):
 
 
 @router.message(BroadcastByIdStates.waiting_for_user_id)
-async def process_user_id_for_broadcast(message: Message, state: FSMContext):
+async def process_user_id_for_broadcast(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода ID пользователя для рассылки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     try:
@@ -235,7 +246,7 @@ async def process_user_id_for_broadcast(message: Message, state: FSMContext):
         return
     
     # Проверяем существование пользователя с указанным ID
-    user = db.get_user_by_id(user_id)
+    user = await async_db.get_user_by_id(user_id)
     if not user:
         await send_error_message(
             message, 
@@ -276,8 +287,8 @@ async def process_user_id_for_broadcast(message: Message, state: FSMContext):
     await state.set_state(BroadcastByIdStates.waiting_for_content)
     
 @router.message(BroadcastByIdStates.waiting_for_content)
-async def process_broadcast_by_id_content(message: Message, state: FSMContext, bot: Bot):
-    if await cancel_state(message, state):
+async def process_broadcast_by_id_content(message: Message, state: FSMContext, bot: Bot, current_user: tuple | None, is_admin: bool):
+    if await cancel_state(message, state, current_user, is_admin):
         return
 
     data = await state.get_data()
@@ -305,14 +316,14 @@ async def process_broadcast_by_id_content(message: Message, state: FSMContext, b
 
 # Исправленные методы для handlers/admin.py
 
-@router.message(F.text == "✏️ Изменить")
+@text_command(router, "✏️ Изменить")
 @router.message(Command("edituser"))
 async def cmd_edit_user(message: Message, state: FSMContext):
     """Обработчик команды изменения пользователя"""
     if not await check_admin(message):
         return
     
-    users = db.get_all_users()
+    users = await async_db.get_all_users()
     if not users:
         await send_error_message(message, "Список пользователей пуст.", reply_markup=get_admin_keyboard())
         return
@@ -346,9 +357,9 @@ async def cmd_edit_user(message: Message, state: FSMContext):
     await state.set_state(EditUserStates.waiting_for_user_id)
 
 @router.message(EditUserStates.waiting_for_user_id)
-async def process_edit_user_id(message: Message, state: FSMContext):
+async def process_edit_user_id(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода ID пользователя для изменения"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     try:
@@ -362,7 +373,7 @@ async def process_edit_user_id(message: Message, state: FSMContext):
         return
     
     # Проверяем существование пользователя
-    user = db.get_user_by_id(user_id)
+    user = await async_db.get_user_by_id(user_id)
     if not user:
         await send_error_message(
             message, 
@@ -403,9 +414,9 @@ async def process_edit_user_id(message: Message, state: FSMContext):
 
 
 @router.message(EditUserStates.waiting_for_action)
-async def process_edit_action(message: Message, state: FSMContext):
+async def process_edit_action(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка выбора действия для изменения пользователя"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     action = message.text.strip()
@@ -424,9 +435,9 @@ async def process_edit_action(message: Message, state: FSMContext):
         )
 
 @router.message(EditUserStates.waiting_for_new_username)
-async def process_new_username_edit(message: Message, state: FSMContext):
+async def process_new_username_edit(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода нового логина"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     new_username = message.text.strip()
@@ -434,7 +445,7 @@ async def process_new_username_edit(message: Message, state: FSMContext):
     user_id = user_data.get('user_id')
     
     # Проверяем, не занят ли новый логин
-    existing_user = db.get_user_by_username(new_username)
+    existing_user = await async_db.get_user_by_username(new_username)
     if existing_user and existing_user[0] != user_id:  # existing_user[0] - это ID
         await send_error_message(
             message, 
@@ -445,7 +456,7 @@ async def process_new_username_edit(message: Message, state: FSMContext):
         return
     
     # Обновляем логин
-    if db.update_username(user_id, new_username):
+    if await async_db.update_username(user_id, new_username):
         await send_success_message(
             message, 
             f"Логин пользователя (ID: {user_id}) успешно изменен на '{new_username}'",
@@ -461,9 +472,9 @@ async def process_new_username_edit(message: Message, state: FSMContext):
     await state.clear()
 
 @router.message(EditUserStates.waiting_for_new_password)
-async def process_new_password_edit(message: Message, state: FSMContext):
+async def process_new_password_edit(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода нового пароля"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     new_password = message.text.strip()
@@ -471,7 +482,7 @@ async def process_new_password_edit(message: Message, state: FSMContext):
     user_id = user_data.get('user_id')
     
     # Обновляем пароль
-    if db.update_password(user_id, new_password):
+    if await async_db.update_password(user_id, new_password):
         await send_success_message(
             message, 
             f"Пароль пользователя (ID: {user_id}) успешно изменен на '{new_password}'",
@@ -486,14 +497,14 @@ async def process_new_password_edit(message: Message, state: FSMContext):
     
     await state.clear()
 
-@router.message(F.text == "❌ Удалить")
+@text_command(router, "❌ Удалить")
 @router.message(Command("deleteuser"))
 async def cmd_delete_user(message: Message, state: FSMContext):
     """Обработчик команды удаления пользователя"""
     if not await check_admin(message):
         return
     
-    users = db.get_all_users()
+    users = await async_db.get_all_users()
     if not users:
         await send_error_message(message, "Список пользователей пуст.", reply_markup=get_admin_keyboard())
         return
@@ -527,9 +538,9 @@ async def cmd_delete_user(message: Message, state: FSMContext):
     await state.set_state(DeleteUserStates.waiting_for_user_id)
 
 @router.message(DeleteUserStates.waiting_for_user_id)
-async def process_delete_user_id(message: Message, state: FSMContext):
+async def process_delete_user_id(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода ID пользователя для удаления"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     try:
@@ -543,7 +554,7 @@ async def process_delete_user_id(message: Message, state: FSMContext):
         return
     
     # Проверяем существование пользователя
-    user = db.get_user_by_id(user_id)
+    user = await async_db.get_user_by_id(user_id)
     if not user:
         await send_error_message(
             message, 
@@ -566,7 +577,7 @@ async def process_delete_user_id(message: Message, state: FSMContext):
         display_name = username
     
     # Удаляем пользователя
-    if db.delete_user(user_id):
+    if await async_db.delete_user(user_id):
         await send_success_message(
             message, 
             f"Пользователь '{display_name}' (ID: {user_id}) успешно удален",
@@ -582,377 +593,303 @@ async def process_delete_user_id(message: Message, state: FSMContext):
     await state.clear()
 
 # Массовая рассылка всем пользователям
-@router.message(F.text == "📢 Рассылка")
+@text_command(router, "📢 Рассылка")
 @router.message(Command("broadcast"))
-async def cmd_broadcast(message: Message, state: FSMContext):
+async def cmd_broadcast(message: Message, state: FSMContext, command: CommandObject | None = None):
     """Обработчик команды /broadcast для начала рассылки всем пользователям"""
     if not await check_admin(message):
         return
     
+    # /broadcast link - только пользователям с сохраненной ссылкой,
+    # /broadcast plain - копия сообщения без заголовка
+    options = set(command.args.split()) if command and command.args else set()
+    with_link = "link" in options
+    await state.update_data(broadcast_with_link=with_link, broadcast_with_header="plain" not in options)
+    
+    audience = "пользователям с сохраненной ссылкой" if with_link else "всем авторизованным пользователям"
+    
     # Теперь просто запрашиваем контент для отправки без выбора типа
     await message.answer(
-        "Отправьте любой контент (текст, фото, видео, аудио, документ), "
-        "который будет разослан всем авторизованным пользователям:",
+        "Отправьте любой контент (текст, фото, видео, аудио, документ или альбом), "
+        f"который будет разослан {audience}:",
         reply_markup=get_cancel_keyboard()
     )
     await state.set_state(BroadcastStates.waiting_for_content)
 
 @router.message(BroadcastStates.waiting_for_content)
-async def process_broadcast_content(message: Message, state: FSMContext, bot: Bot):
+async def process_broadcast_content(message: Message, state: FSMContext, bot: Bot, current_user: tuple | None, is_admin: bool):
     """Обработка любого контента для массовой рассылки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
-    users = db.get_all_users()
-    sent_count = 0
-    failed_count = 0
+    # Части альбома приходят отдельными апдейтами: первая собирает альбом целиком,
+    # остальные ничего не делают
+    content = message
+    if message.media_group_id:
+        content = await album_collector.collect(message)
+        if content is None:
+            return
     
-    logger.info(f"Starting broadcast. Total users: {len(users)}")
-    progress_msg = await message.answer("⏳ Начинаю рассылку...")
+    data = await state.get_data()
     
-    # Отладочная информация
-    await message.answer(f"🔍 Найдено пользователей: {len(users)}")
+    # Аудитория выбирается в SQL: только авторизованные, без недоступных чатов и отправителя.
+    # Задание сохраняется в базе, поэтому рассылка переживет перезапуск бота
+    job_id = await create_broadcast_job(
+        content,
+        with_header=data.get("broadcast_with_header", True),
+        exclude_telegram_id=message.from_user.id,
+        with_link=data.get("broadcast_with_link", False)
+    )
+    logger.info(f"Starting broadcast job {job_id}")
     
-    for user_data in users:
-        try:
-            # Безопасная распаковка данных пользователей
-            user_id = user_data[0]
-            username = user_data[1]
-            telegram_id = user_data[2] if len(user_data) > 2 else None
-            
-            logger.info(f"Processing user: {username}, TG ID: {telegram_id}")
-            
-            # Пропускаем пользователей без telegram_id и отправителя
-            if not telegram_id:
-                logger.info(f"Skipping user {username} - no telegram_id")
-                continue
-                
-            if telegram_id == message.from_user.id:
-                logger.info(f"Skipping sender {username}")
-                continue
-            
-            # Попытка отправки сообщения
-            success = False
-            
-            # Текстовое сообщение
-            if message.text and not message.media_group_id:
-                text = message.text.strip()
-                formatted_message = f"<b>Сообщение от PARTNERS 🔗:</b>\n\n{text}"
-                await bot.send_message(
-                    telegram_id,
-                    formatted_message,
-                    parse_mode="HTML"
-                )
-                success = True
-            
-            # Фото
-            elif message.photo:
-                photo = message.photo[-1]
-                caption = message.caption or ""
-                formatted_caption = f"<b>Сообщение от PARTNERS 🔗:</b>\n\n{caption}" if caption else "<b>Сообщение от PARTNERS 🔗</b>"
-                
-                await bot.send_photo(
-                    telegram_id,
-                    photo=photo.file_id,
-                    caption=formatted_caption,
-                    parse_mode="HTML"
-                )
-                success = True
-            
-            # Видео
-            elif message.video:
-                caption = message.caption or ""
-                formatted_caption = f"<b>Сообщение от PARTNERS 🔗:</b>\n\n{caption}" if caption else "<b>Сообщение от PARTNERS 🔗</b>"
-                
-                await bot.send_video(
-                    telegram_id,
-                    video=message.video.file_id,
-                    caption=formatted_caption,
-                    parse_mode="HTML"
-                )
-                success = True
-            
-            # Аудио
-            elif message.audio:
-                caption = message.caption or ""
-                formatted_caption = f"<b>Сообщение от PARTNERS 🔗:</b>\n\n{caption}" if caption else "<b>Сообщение от PARTNERS 🔗</b>"
-                
-                await bot.send_audio(
-                    telegram_id,
-                    audio=message.audio.file_id,
-                    caption=formatted_caption,
-                    parse_mode="HTML"
-                )
-                success = True
-            
-            # Документ
-            elif message.document:
-                caption = message.caption or ""
-                formatted_caption = f"<b>Сообщение от PARTNERS 🔗:</b>\n\n{caption}" if caption else "<b>Сообщение от PARTNERS 🔗</b>"
-                
-                await bot.send_document(
-                    telegram_id,
-                    document=message.document.file_id,
-                    caption=formatted_caption,
-                    parse_mode="HTML"
-                )
-                success = True
-            
-            # Голосовое сообщение
-            elif message.voice:
-                await bot.send_message(
-                    telegram_id,
-                    "<b>Сообщение от PARTNERS 🔗</b>",
-                    parse_mode="HTML"
-                )
-                await bot.send_voice(
-                    telegram_id,
-                    voice=message.voice.file_id
-                )
-                success = True
-            
-            # Стикер
-            elif message.sticker:
-                await bot.send_message(
-                    telegram_id,
-                    "<b>Сообщение от PARTNERS 🔗</b>",
-                    parse_mode="HTML"
-                )
-                await bot.send_sticker(
-                    telegram_id,
-                    sticker=message.sticker.file_id
-                )
-                success = True
-            
-            # Анимация (GIF)
-            elif message.animation:
-                caption = message.caption or ""
-                formatted_caption = f"<b>Сообщение от PARTNERS 🔗:</b>\n\n{caption}" if caption else "<b>Сообщение от PARTNERS 🔗</b>"
-                
-                await bot.send_animation(
-                    telegram_id,
-                    animation=message.animation.file_id,
-                    caption=formatted_caption,
-                    parse_mode="HTML"
-                )
-                success = True
-            
-            # Видеосообщение
-            elif message.video_note:
-                await bot.send_message(
-                    telegram_id,
-                    "<b>Сообщение от PARTNERS 🔗</b>",
-                    parse_mode="HTML"
-                )
-                await bot.send_video_note(
-                    telegram_id,
-                    video_note=message.video_note.file_id
-                )
-                success = True
-            
-            if success:
-                sent_count += 1
-                logger.info(f"Message sent successfully to user {username} (TG ID: {telegram_id})")
-            else:
-                failed_count += 1
-                logger.warning(f"Unknown message type for user {username}")
-            
-            # Обновляем прогресс каждые 5 отправлений
-            if (sent_count + failed_count) % 5 == 0:
-                try:
-                    await progress_msg.edit_text(f"⏳ Обработано: {sent_count + failed_count}/{len(users)} пользователей\n✅ Отправлено: {sent_count}")
-                except:
-                    pass
-            
-            # Добавляем задержку между отправками
-            await asyncio.sleep(0.3)
-            
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Failed to send message to user {username if 'username' in locals() else 'unknown'}: {e}")
-            import traceback
-            traceback.print_exc()
+    # Рассылка идет в фоне, поэтому админ сразу может работать дальше
+    await state.clear()
+    await run_broadcast_job(bot, job_id)
+    await message.answer("Выберите действие:", reply_markup=get_admin_keyboard())
+
+@router.message(Command("broadcast_retry"))
+async def cmd_broadcast_retry(message: Message, command: CommandObject, bot: Bot):
+    """Повторная отправка рассылки пользователям, которым она не была доставлена"""
+    if not await check_admin(message):
+        return
     
-    # Удаляем сообщение о прогрессе
     try:
-        await progress_msg.delete()
-    except:
-        pass
-    
-    # Подсчитываем количество авторизованных пользователей
-    authorized_users = sum(1 for user_data in users if len(user_data) > 2 and user_data[2] is not None and user_data[2] != message.from_user.id)
-    
-    result_message = (
-        f"📊 Рассылка завершена!\n\n"
-        f"👥 Всего пользователей: {len(users)}\n"
-        f"🔐 Авторизованных: {authorized_users}\n"
-        f"✅ Отправлено: {sent_count}\n"
-        f"❌ Не доставлено: {failed_count}"
-    )
+        job_id = int(command.args.strip())
+    except (AttributeError, ValueError):
+        await send_error_message(message, "Укажите номер рассылки: /broadcast_retry <ID>")
+        return
+    
+    count = await retry_broadcast_job(bot, job_id)
+    if count is None:
+        await send_error_message(message, f"Рассылка #{job_id} не найдена или еще выполняется.")
+    elif count == 0:
+        await send_success_message(message, f"В рассылке #{job_id} нет недоставленных сообщений.")
+
+@router.message(Command("blocked"))
+async def cmd_blocked_users(message: Message):
+    """Список пользователей, исключенных из рассылок из-за недоступного чата"""
+    if not await check_admin(message):
+        return
     
-    logger.info(f"Broadcast completed. Sent: {sent_count}, Failed: {failed_count}")
+    total, users = await async_db.get_unreachable_users()
+    if not total:
+        await message.answer("🚫 Недоступных пользователей нет.")
+        return
     
-    await send_success_message(message, result_message)
-    await message.answer("Выберите действие:", reply_markup=get_admin_keyboard())
-    await state.clear()
+    statuses = {
+        "blocked": "заблокировал бота",
+        "deactivated": "аккаунт удален",
+        "not_found": "чат не найден"
+    }
+    text = f"🚫 Недоступные пользователи (всего: {total}):\n\n"
+    for user_id, username, telegram_id, status, status_at in users:
+        text += f"🆔 {user_id}: {username} (TG: {telegram_id}) - {statuses.get(status, status)}, {status_at}\n"
+    if total > len(users):
+        text += f"\n... и еще {total - len(users)}"
+    text += "\n\nВернуть в рассылки: /reset_blocked <ID> или /reset_blocked all"
+    
+    await message.answer(text)
+
+@router.message(Command("reset_blocked"))
+async def cmd_reset_blocked(message: Message, command: CommandObject):
+    """Возврат пользователя (или всех) в аудиторию рассылок"""
+    if not await check_admin(message):
+        return
+    
+    args = (command.args or "").strip()
+    if args == "all":
+        count = await async_db.reset_delivery_status()
+    else:
+        try:
+            count = await async_db.reset_delivery_status(int(args))
+        except ValueError:
+            await send_error_message(message, "Укажите ID пользователя или all: /reset_blocked <ID>")
+            return
+    
+    await send_success_message(message, f"Возвращено в рассылки: {count}")
 
 async def check_admin_and_get_users(message: Message) -> list:
     """Проверка админа и получение списка пользователей"""
     if not await check_admin(message):
         return None
         
-    users = db.get_all_users()
+    users = await async_db.get_all_users()
     if not users:
         await send_error_message(message, "Список пользователей пуст.", reply_markup=get_admin_keyboard())
         return None
     return users
 
-@router.message(F.text == "👥 Пользователи")
+def format_admin_user_entry(user_data) -> str:
+    """Карточка пользователя для списка админа"""
+    user_id, username, password, telegram_id, link, full_name = user_data
+    
+    # Формируем отображение имени
+    if full_name and full_name.strip():
+        display_name = f"{full_name} (@{username})"
+    else:
+        display_name = username
+    
+    user_text = f"🆔 ID: {user_id}\n"
+    user_text += f"👤 Имя: {display_name}\n"
+    user_text += f"📝 Логин: {username}\n"
+    user_text += f"🔐 Пароль: {password}\n"
+    
+    if telegram_id:
+        user_text += f"✅ Авторизован (TG: {telegram_id})\n"
+    else:
+        user_text += f"❌ Не авторизован\n"
+    
+    user_text += f"🔗 Информация: {link or '—'}\n"
+    return user_text
+
+async def get_users_page_view(after_id=None, before_id=None, last=False):
+    """Текст и клавиатура одной страницы списка пользователей"""
+    rows, has_prev, has_next = await async_db.get_users_page(
+        after_id=after_id, before_id=before_id, last=last, limit=USERS_PAGE_SIZE
+    )
+    if not rows:
+        return None, None
+    
+    text = f"📊 Пользователи (ID {rows[0][0]}–{rows[-1][0]}):\n\n"
+    text += ("─" * 30 + "\n\n").join(format_admin_user_entry(row) for row in rows)
+    if len(text) > MAX_MESSAGE_LENGTH:
+        text = text[:MAX_MESSAGE_LENGTH - 1] + "…"
+    
+    keyboard = get_users_page_keyboard(rows[0][0], rows[-1][0], has_prev, has_next)
+    return text, keyboard
+
+@text_command(router, "👥 Пользователи")
 @router.message(Command("admin"))
 async def cmd_admin(message: Message):
-    """Обработчик команды /admin с разбивкой на части"""
+    """Обработчик команды /admin: постраничный просмотр пользователей"""
     if not await check_admin(message):
         return
     
-    users = db.get_all_users()
-    if not users:
+    text, keyboard = await get_users_page_view()
+    if not text:
         await send_error_message(message, "Список пользователей пуст.")
-        await message.answer("Функции администрирования:", reply_markup=get_admin_keyboard())
-        return
-    
-    # Разбиваем список пользователей на части
-    await send_user_list_in_parts(message, users)
+    else:
+        await message.answer(text, reply_markup=keyboard)
     
     await message.answer(
         "Функции администрирования:",
         reply_markup=get_admin_keyboard()
     )
 
-async def send_user_list_in_parts(message: Message, users: list):
-    """Отправка списка пользователей частями с улучшенной обработкой"""
-    if not users:
-        await message.answer("Список пользователей пуст.")
+@router.callback_query(F.data.startswith("users_page:"))
+async def process_users_page(callback: CallbackQuery, is_admin: bool):
+    """Переключение страницы списка пользователей с редактированием сообщения"""
+    if not is_admin:
+        await callback.answer("❌ У вас нет доступа к этой команде.", show_alert=True)
         return
     
-    # Константы для разбивки (оставляем больше запаса)
-    MAX_MESSAGE_LENGTH = 3800  # Запас от лимита в 4096 символов
+    action, _, value = callback.data.removeprefix("users_page:").partition(":")
+    try:
+        if action == "next":
+            text, keyboard = await get_users_page_view(after_id=int(value))
+        elif action == "prev":
+            text, keyboard = await get_users_page_view(before_id=int(value))
+        elif action == "last":
+            text, keyboard = await get_users_page_view(last=True)
+        else:
+            text, keyboard = await get_users_page_view()
+    except ValueError:
+        await callback.answer()
+        return
     
-    # Заголовок
-    header = f"📊 Список всех пользователей (всего: {len(users)}):\n\n"
+    if not text:
+        await callback.answer("Список пользователей пуст.", show_alert=True)
+        return
     
-    # Формируем данные для каждого пользователя
-    user_entries = []
-    for user_data in users:
-        try:
-            # Безопасная распаковка данных
-            user_id = user_data[0]
-            username = user_data[1]
-            telegram_id = user_data[2] if len(user_data) > 2 else None
-            link = user_data[3] if len(user_data) > 3 else None
-            full_name = user_data[4] if len(user_data) > 4 else None
-            
-            # Получаем пароль из базы данных
-            try:
-                user_db_data = db.get_user_by_username(username)
-                password = user_db_data[1] if user_db_data else "❌ Ошибка"
-            except Exception as e:
-                logger.error(f"Error getting user password for {username}: {e}")
-                password = "❌ Ошибка"
-            
-            # Формируем отображение имени
-            if full_name and full_name.strip():
-                display_name = f"{full_name} (@{username})"
-            else:
-                display_name = username
-            
-            # Формируем текст для одного пользователя
-            user_text = f"🆔 ID: {user_id}\n"
-            user_text += f"👤 Имя: {display_name}\n"
-            user_text += f"📝 Логин: {username}\n"
-            user_text += f"🔐 Пароль: {password}\n"
-            
-            if telegram_id:
-                user_text += f"✅ Авторизован (TG: {telegram_id})\n"
-            else:
-                user_text += f"❌ Не авторизован\n"
-            
-            # Показываем ссылки полностью
-            if link:
-                user_text += f"🔗 Информация: {link}\n"
-            else:
-                user_text += f"🔗 Информация: —\n"
-            
-            user_text += "─" * 30 + "\n\n"
-            
-            user_entries.append(user_text)
-            
-        except Exception as e:
-            logger.error(f"Error processing user data: {e}")
-            # Добавляем базовую информацию даже при ошибке
-            user_entries.append(f"❌ Ошибка обработки пользователя ID: {user_data[0] if user_data else 'Unknown'}\n\n")
-    
-    # Разбиваем на части
-    parts = []
-    current_part = ""
-    
-    for i, user_entry in enumerate(user_entries):
-        # Для первой части учитываем длину заголовка
-        if not current_part:
-            test_length = len(header) + len(current_part) + len(user_entry)
-        else:
-            test_length = len(current_part) + len(user_entry)
-        
-        if test_length > MAX_MESSAGE_LENGTH and current_part:
-            # Если не помещается и есть текущая часть, сохраняем её
-            parts.append(current_part.rstrip())
-            current_part = user_entry
-        else:
-            # Если помещается, добавляем к текущей части
-            current_part += user_entry
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        # Повторное нажатие на ту же страницу
+        if "message is not modified" not in e.message:
+            raise
+    await callback.answer()
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Сводная статистика пользователей"""
+    if not await check_admin(message):
+        return
+    
+    stats = await async_db.get_user_stats()
+    text = (
+        "📈 Статистика:\n"
+        f"👥 Всего пользователей: {stats['total']}\n"
+        f"✅ Авторизованных: {stats['authorized']}\n"
+        f"❌ Не авторизованных: {stats['unauthorized']}\n"
+        f"🔗 С сохраненной ссылкой: {stats['with_link']}\n"
+        f"🚫 Недоступны для рассылки: {stats['unreachable']}\n"
+    )
+    if stats["registrations"]:
+        text += "\n📝 Регистрации за неделю:\n"
+        text += "\n".join(f"{day}: {count}" for day, count in stats["registrations"])
     
-    # Добавляем последнюю часть
-    if current_part:
-        parts.append(current_part.rstrip())
+    await message.answer(text)
+
+@router.message(Command("find"))
+async def cmd_find_user(message: Message, command: CommandObject):
+    """Поиск пользователей: /find <логин, имя, ссылка или ID>"""
+    if not await check_admin(message):
+        return
     
-    # Отправляем части
-    for i, part in enumerate(parts):
-        try:
-            if i == 0:
-                # Первая часть с заголовком
-                full_message = header + part
-            else:
-                # Остальные части с номером
-                full_message = f"📊 Список пользователей (часть {i + 1}):\n\n{part}"
-            
-            await message.answer(full_message)
-            
-            # Небольшая задержка между сообщениями
-            await asyncio.sleep(0.2)
-            
-        except Exception as e:
-            logger.error(f"Error sending user list part {i + 1}: {e}")
-            await message.answer(f"❌ Ошибка при отправке части {i + 1} списка пользователей")
+    query = (command.args or "").strip()
+    if not query:
+        await send_error_message(message, "Укажите запрос: /find <логин, имя, ссылка или ID>")
+        return
+    
+    users = await async_db.search_users(query)
+    if not users:
+        await send_error_message(message, f"По запросу «{query}» ничего не найдено.")
+        return
     
-    # Добавляем итоговую информацию
+    text = f"🔍 Найдено по запросу «{query}»: {len(users)}\n\n"
+    for user_data in users:
+        user_id, username, telegram_id, link = user_data[:4]
+        text += f"🆔 {user_id} | {get_display_name(user_data, username)}"
+        text += f" | ✅ TG: {telegram_id}\n" if telegram_id else " | ❌ Не авторизован\n"
+        if link:
+            text += f"🔗 {link}\n"
+        text += "\n"
+    if len(text) > MAX_MESSAGE_LENGTH:
+        text = text[:MAX_MESSAGE_LENGTH - 1] + "…"
+    
+    await message.answer(text)
+
+@router.message(Command("export_users"))
+async def cmd_export_users(message: Message, command: CommandObject):
+    """Выгрузка всех пользователей одним файлом: /export_users [xlsx]"""
+    if not await check_admin(message):
+        return
+    
+    as_xlsx = (command.args or "").strip().lower() == "xlsx"
+    if as_xlsx and not xlsx_available():
+        await send_error_message(message, "Выгрузка в XLSX недоступна: не установлен openpyxl.")
+        return
+    
+    # Файл собирается в потоке базы данных, строки читаются из SQLite пачками
+    stamp = datetime.now().strftime("%Y%m%d_%H%M")
     try:
-        summary = f"📈 Статистика:\n"
-        summary += f"👥 Всего пользователей: {len(users)}\n"
-        
-        # Подсчитываем авторизованных пользователей
-        authorized_count = sum(1 for user_data in users if len(user_data) > 2 and user_data[2] is not None)
-        summary += f"✅ Авторизованных: {authorized_count}\n"
-        summary += f"❌ Не авторизованных: {len(users) - authorized_count}\n"
-        
-        if len(parts) > 1:
-            summary += f"📄 Частей сообщений: {len(parts)}"
-        
-        await message.answer(summary)
-        
+        if as_xlsx:
+            data = await async_db.run(export_users_xlsx, db.iter_users_for_export())
+            filename = f"users_{stamp}.xlsx"
+        else:
+            data = await async_db.run(export_users_csv_gz, db.iter_users_for_export())
+            filename = f"users_{stamp}.csv.gz"
     except Exception as e:
-        logger.error(f"Error sending user list summary: {e}")
-        await message.answer(f"📊 Всего пользователей: {len(users)}")
+        logger.error(f"Error exporting users: {e}")
+        await send_error_message(message, "Не удалось выгрузить пользователей.")
+        return
+    
+    await message.answer_document(
+        BufferedInputFile(data, filename=filename),
+        caption="📊 Выгрузка пользователей"
+    )
 
-@router.message(F.text == "🏪 Добавить")
+@text_command(router, "🏪 Добавить")
 @router.message(Command("adduser"))
 async def cmd_add_user(message: Message, state: FSMContext):
     """Обработчик команды /adduser"""
@@ -963,13 +900,13 @@ async def cmd_add_user(message: Message, state: FSMContext):
     await state.set_state(AddUserStates.waiting_for_username)
 
 @router.message(AddUserStates.waiting_for_username)
-async def process_new_username(message: Message, state: FSMContext):
+async def process_new_username(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода логина для нового пользователя"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     username = message.text.strip()
-    if db.get_user_by_username(username):
+    if await async_db.get_user_by_username(username):
         await send_error_message(message, f"Пользователь с логином '{username}' уже существует. Попробуйте другой логин.")
         return
     
@@ -978,16 +915,16 @@ async def process_new_username(message: Message, state: FSMContext):
     await state.set_state(AddUserStates.waiting_for_password)
 
 @router.message(AddUserStates.waiting_for_password)
-async def process_new_password(message: Message, state: FSMContext):
+async def process_new_password(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода пароля и создание нового пользователя"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
         
     password = message.text.strip()
     user_data = await state.get_data()
     username = user_data.get('username')
     
-    if db.add_user(username, password):
+    if await async_db.add_user(username, password):
         await send_success_message(
             message,
             f"Пользователь '{username}' успешно создан!\n\nЛогин: {username}\nПароль: {password}"
@@ -1002,7 +939,7 @@ async def process_new_password(message: Message, state: FSMContext):
     
     await state.clear()
 
-@router.message(F.text == "✏️ Изменить приветствие")
+@text_command(router, "✏️ Изменить приветствие")
 @router.message(Command("edit_welcome"))
 async def cmd_edit_welcome(message: Message, state: FSMContext):
     """Обработчик команды для изменения приветственного сообщения"""
@@ -1023,9 +960,9 @@ async def cmd_edit_welcome(message: Message, state: FSMContext):
     await state.set_state(WelcomeMessageStates.waiting_for_message)
 
 @router.message(WelcomeMessageStates.waiting_for_message)
-async def process_welcome_message(message: Message, state: FSMContext):
+async def process_welcome_message(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка нового приветственного сообщения"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     new_welcome_message = message.text.strip()
@@ -1070,7 +1007,7 @@ def setup(dp: Dispatcher):
 
 
 
-@router.message(F.text == "🔘 Управление кнопками")
+@text_command(router, "🔘 Управление кнопками")
 async def cmd_manage_buttons(message: Message):
     """Обработчик входа в управление кнопками"""
     if not await check_admin(message):
@@ -1081,7 +1018,7 @@ async def cmd_manage_buttons(message: Message):
         reply_markup=get_button_management_keyboard()
     )
 
-@router.message(F.text == "↩️ Назад к админке")
+@text_command(router, "↩️ Назад к админке")
 async def cmd_back_to_admin(message: Message):
     """Возврат к админ панели"""
     if not await check_admin(message):
@@ -1089,7 +1026,7 @@ async def cmd_back_to_admin(message: Message):
     
     await message.answer("Функции администрирования:", reply_markup=get_admin_keyboard())
 
-@router.message(F.text == "➕ Добавить кнопку")
+@text_command(router, "➕ Добавить кнопку")
 async def cmd_add_button(message: Message, state: FSMContext):
     """Добавление новой кастомной кнопки"""
     if not await check_admin(message):
@@ -1102,9 +1039,9 @@ async def cmd_add_button(message: Message, state: FSMContext):
     await state.set_state(CustomButtonStates.waiting_for_button_name)
 
 @router.message(CustomButtonStates.waiting_for_button_name)
-async def process_button_name(message: Message, state: FSMContext):
+async def process_button_name(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка названия кнопки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     button_name = message.text.strip()
@@ -1121,9 +1058,9 @@ async def process_button_name(message: Message, state: FSMContext):
     await state.set_state(CustomButtonStates.waiting_for_button_url)
 
 @router.message(CustomButtonStates.waiting_for_button_url)
-async def process_button_url(message: Message, state: FSMContext):
+async def process_button_url(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ссылки кнопки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     raw_url = message.text.strip()
@@ -1131,11 +1068,10 @@ async def process_button_url(message: Message, state: FSMContext):
         await send_error_message(message, "Ссылка не может быть пустой.")
         return
     
-    # Валидация и исправление URL
-    fixed_url = validate_and_fix_url(raw_url)
-    
-    # Проверяем валидность исправленного URL
-    if not is_valid_url(fixed_url):
+    # Валидация и исправление URL; результат сохраняется в базе без повторной нормализации
+    normalized = normalize_button_url(raw_url)
+    fixed_url, is_valid, _ = normalized
+    if not is_valid:
         await send_error_message(
             message, 
             f"Невалидная ссылка: {raw_url}\n\n"
@@ -1159,7 +1095,7 @@ async def process_button_url(message: Message, state: FSMContext):
         )
     
     # Сохраняем кнопку в базу данных
-    if db.add_custom_button(button_name, fixed_url):
+    if await async_db.add_custom_button(button_name, fixed_url, normalized):
         await send_success_message(
             message,
             f"✅ Кнопка успешно создана!\n\n"
@@ -1172,13 +1108,13 @@ async def process_button_url(message: Message, state: FSMContext):
     await message.answer("Управление кнопками:", reply_markup=get_button_management_keyboard())
     await state.clear()
 
-@router.message(F.text == "📋 Список кнопок")
+@text_command(router, "📋 Список кнопок")
 async def cmd_list_buttons(message: Message):
     """Показать список всех кнопок"""
     if not await check_admin(message):
         return
     
-    buttons = db.get_custom_buttons(active_only=False)
+    buttons = await async_db.get_custom_buttons(active_only=False)
     
     if not buttons:
         await message.answer("📋 Кастомных кнопок пока нет.")
@@ -1197,13 +1133,13 @@ async def cmd_list_buttons(message: Message):
     await message.answer("Управление кнопками:", reply_markup=get_button_management_keyboard())
 
 # РЕДАКТИРОВАНИЕ КНОПКИ
-@router.message(F.text == "✏️ Изменить кнопку")
+@text_command(router, "✏️ Изменить кнопку")
 async def cmd_edit_button(message: Message, state: FSMContext):
     """Изменение кастомной кнопки"""
     if not await check_admin(message):
         return
     
-    buttons = db.get_custom_buttons(active_only=False)
+    buttons = await async_db.get_custom_buttons(active_only=False)
     
     if not buttons:
         await send_error_message(message, "Нет кнопок для изменения.")
@@ -1220,9 +1156,9 @@ async def cmd_edit_button(message: Message, state: FSMContext):
     await state.set_state(CustomButtonStates.waiting_for_button_id)
 
 @router.message(CustomButtonStates.waiting_for_button_id)
-async def process_edit_button_id(message: Message, state: FSMContext):
+async def process_edit_button_id(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ID кнопки для изменения"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     try:
@@ -1231,7 +1167,7 @@ async def process_edit_button_id(message: Message, state: FSMContext):
         await send_error_message(message, "Введите корректный числовой ID кнопки.")
         return
     
-    button = db.get_custom_button_by_id(button_id)
+    button = await async_db.get_custom_button_by_id(button_id)
     if not button:
         await send_error_message(message, f"Кнопка с ID {button_id} не найдена.")
         await message.answer("Управление кнопками:", reply_markup=get_button_management_keyboard())
@@ -1252,9 +1188,9 @@ async def process_edit_button_id(message: Message, state: FSMContext):
     await state.set_state(CustomButtonStates.waiting_for_edit_choice)
 
 @router.message(CustomButtonStates.waiting_for_edit_choice)
-async def process_edit_choice(message: Message, state: FSMContext):
+async def process_edit_choice(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка выбора что изменить"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     choice = message.text.strip()
@@ -1269,9 +1205,9 @@ async def process_edit_choice(message: Message, state: FSMContext):
         await send_error_message(message, "Выберите действие из предложенных кнопок.")
 
 @router.message(CustomButtonStates.waiting_for_new_name)
-async def process_new_button_name(message: Message, state: FSMContext):
+async def process_new_button_name(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка нового названия кнопки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     new_name = message.text.strip()
@@ -1282,7 +1218,7 @@ async def process_new_button_name(message: Message, state: FSMContext):
     user_data = await state.get_data()
     button_id = user_data.get('button_id')
     
-    if db.update_custom_button(button_id, name=new_name):
+    if await async_db.update_custom_button(button_id, name=new_name):
         await send_success_message(message, f"Название кнопки успешно изменено на '{new_name}'")
     else:
         await send_error_message(message, "Не удалось изменить название кнопки.")
@@ -1291,9 +1227,9 @@ async def process_new_button_name(message: Message, state: FSMContext):
     await state.clear()
 
 @router.message(CustomButtonStates.waiting_for_new_url)
-async def process_new_button_url(message: Message, state: FSMContext):
+async def process_new_button_url(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка новой ссылки кнопки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     raw_url = message.text.strip()
@@ -1301,11 +1237,10 @@ async def process_new_button_url(message: Message, state: FSMContext):
         await send_error_message(message, "Ссылка не может быть пустой.")
         return
     
-    # Валидация и исправление URL
-    fixed_url = validate_and_fix_url(raw_url)
-    
-    # Проверяем валидность исправленного URL
-    if not is_valid_url(fixed_url):
+    # Валидация и исправление URL; результат сохраняется в базе без повторной нормализации
+    normalized = normalize_button_url(raw_url)
+    fixed_url, is_valid, _ = normalized
+    if not is_valid:
         await send_error_message(
             message, 
             f"Невалидная ссылка: {raw_url}\n\n"
@@ -1328,7 +1263,7 @@ async def process_new_button_url(message: Message, state: FSMContext):
             f"Исправленная: {fixed_url}"
         )
     
-    if db.update_custom_button(button_id, url=fixed_url):
+    if await async_db.update_custom_button(button_id, url=fixed_url, normalized=normalized):
         await send_success_message(message, f"Ссылка кнопки успешно изменена на '{fixed_url}'")
     else:
         await send_error_message(message, "Не удалось изменить ссылку кнопки.")
@@ -1336,13 +1271,13 @@ async def process_new_button_url(message: Message, state: FSMContext):
     await message.answer("Управление кнопками:", reply_markup=get_button_management_keyboard())
     await state.clear()
 # ПЕРЕКЛЮЧЕНИЕ КНОПКИ
-@router.message(F.text == "🔄 Вкл/Выкл кнопку")
+@text_command(router, "🔄 Вкл/Выкл кнопку")
 async def cmd_toggle_button(message: Message, state: FSMContext):
     """Включение/выключение кнопки"""
     if not await check_admin(message):
         return
     
-    buttons = db.get_custom_buttons(active_only=False)
+    buttons = await async_db.get_custom_buttons(active_only=False)
     
     if not buttons:
         await send_error_message(message, "Нет кнопок для переключения.")
@@ -1359,9 +1294,9 @@ async def cmd_toggle_button(message: Message, state: FSMContext):
     await state.set_state(CustomButtonStates.waiting_for_toggle_id)
 
 @router.message(CustomButtonStates.waiting_for_toggle_id)
-async def process_toggle_button_id(message: Message, state: FSMContext):
+async def process_toggle_button_id(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ID кнопки для переключения"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     try:
@@ -1370,7 +1305,7 @@ async def process_toggle_button_id(message: Message, state: FSMContext):
         await send_error_message(message, "Введите корректный числовой ID кнопки.")
         return
     
-    button = db.get_custom_button_by_id(button_id)
+    button = await async_db.get_custom_button_by_id(button_id)
     if not button:
         await send_error_message(message, f"Кнопка с ID {button_id} не найдена.")
         await message.answer("Управление кнопками:", reply_markup=get_button_management_keyboard())
@@ -1379,7 +1314,7 @@ async def process_toggle_button_id(message: Message, state: FSMContext):
     
     button_id, name, url, is_active = button
     
-    if db.toggle_custom_button(button_id):
+    if await async_db.toggle_custom_button(button_id):
         new_status = "отключена" if is_active else "активирована"
         await send_success_message(message, f"Кнопка '{name}' успешно {new_status}!")
     else:
@@ -1389,13 +1324,13 @@ async def process_toggle_button_id(message: Message, state: FSMContext):
     await state.clear()
 
 # УДАЛЕНИЕ КНОПКИ
-@router.message(F.text == "🗑 Удалить кнопку")
+@text_command(router, "🗑 Удалить кнопку")
 async def cmd_delete_button(message: Message, state: FSMContext):
     """Удаление кнопки"""
     if not await check_admin(message):
         return
     
-    buttons = db.get_custom_buttons(active_only=False)
+    buttons = await async_db.get_custom_buttons(active_only=False)
     
     if not buttons:
         await send_error_message(message, "Нет кнопок для удаления.")
@@ -1411,9 +1346,9 @@ async def cmd_delete_button(message: Message, state: FSMContext):
     await state.set_state(CustomButtonStates.waiting_for_delete_id)
 
 @router.message(CustomButtonStates.waiting_for_delete_id)
-async def process_delete_button_id(message: Message, state: FSMContext):
+async def process_delete_button_id(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ID кнопки для удаления"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     try:
@@ -1422,7 +1357,7 @@ async def process_delete_button_id(message: Message, state: FSMContext):
         await send_error_message(message, "Введите корректный числовой ID кнопки.")
         return
     
-    button = db.get_custom_button_by_id(button_id)
+    button = await async_db.get_custom_button_by_id(button_id)
     if not button:
         await send_error_message(message, f"Кнопка с ID {button_id} не найдена.")
         await message.answer("Управление кнопками:", reply_markup=get_button_management_keyboard())
@@ -1431,7 +1366,7 @@ async def process_delete_button_id(message: Message, state: FSMContext):
     
     button_id, name, url, is_active = button
     
-    if db.delete_custom_button(button_id):
+    if await async_db.delete_custom_button(button_id):
         await send_success_message(message, f"Кнопка '{name}' успешно удалена!")
     else:
         await send_error_message(message, "Не удалось удалить кнопку.")
@@ -1,5 +1,5 @@
 from aiogram import Router, F, Bot, Dispatcher, types
-from aiogram.types import Message, BufferedInputFile, ReplyKeyboardRemove, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, BufferedInputFile, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from io import BytesIO
@@ -9,16 +9,42 @@ import logging
 logger = logging.getLogger(__name__)
 
 from datetime import datetime
-from database import db
+from database import async_db
 from models import AuthStates, RegistrationStates
 from config import ADMIN_IDS, BOT_NAME, get_welcome_message
 from utils.keyboards import get_start_keyboard, get_main_keyboard, get_admin_keyboard, get_admin_inline_keyboard, get_auth_keyboard
-from utils.captcha import generate_captcha_text, generate_captcha_image
+from utils.captcha_pool import captcha_pool
+from utils.media import media_registry, WELCOME_LOGO_PATH
+from utils.text_commands import text_command
 from utils.helpers import send_error_message, send_success_message, cancel_state
 
 # Создаем роутер для аутентификации
 router = Router()
 
+async def send_welcome(message: Message):
+    """Приветственное сообщение с логотипом (логотип отправляется по file_id)"""
+    welcome_message = get_welcome_message()
+    
+    if os.path.exists(WELCOME_LOGO_PATH):
+        try:
+            await media_registry.send_photo(
+                message.bot, message.chat.id, WELCOME_LOGO_PATH,
+                caption=welcome_message,
+                parse_mode="HTML"
+            )
+        except Exception as e:
+            logger.error(f"Error sending welcome message with photo: {e}")
+            await media_registry.send_photo(
+                message.bot, message.chat.id, WELCOME_LOGO_PATH,
+                caption=welcome_message
+            )
+    else:
+        try:
+            await message.answer(welcome_message, parse_mode="HTML")
+        except Exception as e:
+            logger.error(f"Error sending welcome message: {e}")
+            await message.answer(welcome_message)
+
 # Функция для создания клавиатуры с кнопкой "Старт" для неавторизованных пользователей
 def get_start_button():
     kb = [
@@ -28,7 +54,7 @@ def get_start_button():
 
 @router.message(CommandStart())
 @router.callback_query(F.data == "start_bot")
-async def cmd_start(event: Message | types.CallbackQuery, state: FSMContext):
+async def cmd_start(event: Message | types.CallbackQuery, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработчик команды /start и нажатия на кнопку Старт"""
     # Определяем, что это: сообщение или callback
     is_callback = isinstance(event, types.CallbackQuery)
@@ -37,20 +63,14 @@ async def cmd_start(event: Message | types.CallbackQuery, state: FSMContext):
         # Если это callback, то нужно ответить на него и получить сообщение
         await event.answer()
         message = event.message
-        user_id = event.from_user.id
     else:
         # Если это сообщение, то просто используем его
         message = event
-        user_id = message.from_user.id
-    
-    # Проверяем, авторизован ли пользователь
-    user = db.get_user_by_telegram_id(user_id)
     
-    if user:  # Если пользователь уже авторизован
-        is_admin = user_id in ADMIN_IDS
-        
+    # Проверяем, авторизован ли пользователь (current_user загружен AuthMiddleware)
+    if current_user:  # Если пользователь уже авторизован
         # Отправляем приветственное сообщение
-        await message.answer(f"С возвращением, {user[1]}! Чем могу помочь?")
+        await message.answer(f"С возвращением, {current_user[1]}! Чем могу помочь?")
         
         # Отображаем нужные клавиатуры
         if is_admin:
@@ -67,15 +87,14 @@ async def cmd_start(event: Message | types.CallbackQuery, state: FSMContext):
             # Для обычного пользователя - только инлайн клавиатура
             await message.answer(
                 "Выберите действие:", 
-                reply_markup=get_main_keyboard()
+                reply_markup=await get_main_keyboard()
             )
         
         return  # Завершаем обработку для авторизованных пользователей
     
     # Для неавторизованных пользователей сразу показываем капчу
-    # Генерация капчи
-    captcha_text = generate_captcha_text()
-    captcha_image = generate_captcha_image(captcha_text)
+    # Капча берется из заранее сгенерированного пула
+    captcha_text, captcha_image, captcha_filename = await captcha_pool.get()
     
     await state.update_data(captcha_text=captcha_text)
     
@@ -86,7 +105,7 @@ async def cmd_start(event: Message | types.CallbackQuery, state: FSMContext):
     
     # В aiogram 3.x для отправки байтов используем BufferedInputFile вместо FSInputFile
     await message.answer_photo(
-        BufferedInputFile(captcha_image, filename="captcha.png")
+        BufferedInputFile(captcha_image, filename=captcha_filename)
     )
     await state.set_state(AuthStates.waiting_for_captcha)
 
@@ -114,7 +133,7 @@ async def process_captcha(message: Message, state: FSMContext):
     await state.clear()
 
 @router.message(Command("register"))
-@router.message(F.text == "📝 Регистрация")
+@text_command(router, "📝 Регистрация")
 async def cmd_register(message: Message, state: FSMContext):
     """Начало процесса регистрации"""
     await message.answer(
@@ -129,7 +148,7 @@ async def process_registration_username(message: Message, state: FSMContext):
     username = message.text.strip()
     
     # Проверяем, не занят ли логин
-    if db.get_user_by_username(username):
+    if await async_db.get_user_by_username(username):
         await send_error_message(
             message,
             f"Логин '{username}' уже занят. Попробуйте другой."
@@ -179,7 +198,7 @@ async def process_registration_password(message: Message, state: FSMContext):
     await state.set_state(RegistrationStates.waiting_for_password_confirm)
 
 @router.message(RegistrationStates.waiting_for_password_confirm)
-async def process_registration_password_confirm(message: Message, state: FSMContext, bot: Bot):
+async def process_registration_password_confirm(message: Message, state: FSMContext, bot: Bot, is_admin: bool):
     """Подтверждение пароля и завершение регистрации"""
     password_confirm = message.text.strip()
     user_data = await state.get_data()
@@ -203,12 +222,12 @@ async def process_registration_password_confirm(message: Message, state: FSMCont
     full_name = message.from_user.full_name
     
     # Создаем пользователя с полным именем
-    if db.add_user(username, password, full_name):
+    if await async_db.add_user(username, password, full_name):
         # Получаем ID созданного пользователя
-        user_id = db.authenticate_user(username, password)
+        user_id = await async_db.authenticate_user(username, password)
         
         # Привязываем Telegram ID с полным именем
-        db.update_telegram_id(user_id, message.from_user.id, full_name)
+        await async_db.update_telegram_id(user_id, message.from_user.id, full_name)
         
         # Отправляем уведомление админам о новой регистрации
         await send_admin_notification_registration(bot, username, full_name, message.from_user.id)
@@ -222,33 +241,7 @@ async def process_registration_password_confirm(message: Message, state: FSMCont
         )
         
         # Теперь отправляем приветственное сообщение с логотипом
-        logo_path = "assets/logo.jpg"
-        
-        if os.path.exists(logo_path):
-            try:
-                await message.answer_photo(
-                    FSInputFile(logo_path),
-                    caption=get_welcome_message(),
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.error(f"Error sending welcome message with photo: {e}")
-                await message.answer_photo(
-                    FSInputFile(logo_path),
-                    caption=get_welcome_message()
-                )
-        else:
-            try:
-                await message.answer(
-                    get_welcome_message(),
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.error(f"Error sending welcome message: {e}")
-                await message.answer(get_welcome_message())
-        
-        # Определяем, является ли пользователь админом
-        is_admin = message.from_user.id in ADMIN_IDS
+        await send_welcome(message)
         
         # Отправляем соответствующие клавиатуры
         if is_admin:
@@ -263,7 +256,7 @@ async def process_registration_password_confirm(message: Message, state: FSMCont
         else:
             await message.answer(
                 "Выберите действие:",
-                reply_markup=get_main_keyboard()
+                reply_markup=await get_main_keyboard()
             )
         
         await state.clear()
@@ -275,7 +268,7 @@ async def process_registration_password_confirm(message: Message, state: FSMCont
         await state.clear()
     
 @router.message(Command("login"))
-@router.message(F.text == "🔑 Авторизоваться")
+@text_command(router, "🔑 Авторизоваться")
 async def cmd_login(message: Message, state: FSMContext):
     """Начало процесса авторизации"""
     await message.answer("Введите ваш логин для входа:", reply_markup=ReplyKeyboardRemove())
@@ -335,14 +328,14 @@ async def send_admin_notification_registration(bot: Bot, username, user_full_nam
         logger.error(f"Failed to send admin notification: {e}")
 
 @router.message(AuthStates.waiting_for_password)
-async def process_password(message: Message, state: FSMContext, bot: Bot):
+async def process_password(message: Message, state: FSMContext, bot: Bot, is_admin: bool):
     """Обработка ввода пароля и завершение авторизации"""
     password = message.text.strip()
     user_data = await state.get_data()
     username = user_data.get('username')
     
     # Проверка учетных данных
-    user_id = db.authenticate_user(username, password)
+    user_id = await async_db.authenticate_user(username, password)
     
     if not user_id:
         await send_error_message(
@@ -358,7 +351,7 @@ async def process_password(message: Message, state: FSMContext, bot: Bot):
     full_name = message.from_user.full_name
     
     # Обновление Telegram ID пользователя с полным именем
-    db.update_telegram_id(user_id, message.from_user.id, full_name)
+    await async_db.update_telegram_id(user_id, message.from_user.id, full_name)
     
     # Отправляем уведомление админу о новой авторизации
     await send_admin_notification(bot, username, full_name, message.from_user.id)
@@ -370,32 +363,7 @@ async def process_password(message: Message, state: FSMContext, bot: Bot):
     )
     
     # Отправляем приветственное сообщение с логотипом
-    logo_path = "assets/logo.jpg"
-    
-    if os.path.exists(logo_path):
-        try:
-            await message.answer_photo(
-                FSInputFile(logo_path),
-                caption=get_welcome_message(),
-                parse_mode="HTML"
-            )
-        except Exception as e:
-            logger.error(f"Error sending welcome message with photo: {e}")
-            await message.answer_photo(
-                FSInputFile(logo_path),
-                caption=get_welcome_message()
-            )
-    else:
-        try:
-            await message.answer(
-                get_welcome_message(),
-                parse_mode="HTML"
-            )
-        except Exception as e:
-            logger.error(f"Error sending welcome message: {e}")
-            await message.answer(get_welcome_message())
-    
-    is_admin = message.from_user.id in ADMIN_IDS
+    await send_welcome(message)
     
     # Отправляем основные кнопки для работы со ссылками
     if is_admin:
@@ -414,15 +382,15 @@ async def process_password(message: Message, state: FSMContext, bot: Bot):
         # Для обычного пользователя - просто инлайн-кнопки
         await message.answer(
             "Выберите действие:",
-            reply_markup=get_main_keyboard()
+            reply_markup=await get_main_keyboard()
         )
     
     await state.clear()
 
 @router.message(Command("logout"))
-@router.message(F.text == "🚪 Выйти")
+@text_command(router, "🚪 Выйти")
 @router.callback_query(F.data == "logout")
-async def cmd_logout(event: Message | types.CallbackQuery):
+async def cmd_logout(event: Message | types.CallbackQuery, current_user: tuple | None):
     """Выход из аккаунта"""
     # Определяем, что это: сообщение или callback
     is_callback = isinstance(event, types.CallbackQuery)
@@ -431,15 +399,11 @@ async def cmd_logout(event: Message | types.CallbackQuery):
         # Если это callback, то нужно ответить на него и получить данные
         await event.answer()
         message = event.message
-        user_id = event.from_user.id
     else:
         # Если это сообщение, то просто используем его
         message = event
-        user_id = message.from_user.id
-    
-    user = db.get_user_by_telegram_id(user_id)
     
-    if not user:
+    if not current_user:
         text = "Вы не авторизованы."
         if is_callback:
             await message.answer(f"❌ {text}", reply_markup=get_start_button())
@@ -448,7 +412,7 @@ async def cmd_logout(event: Message | types.CallbackQuery):
         return
     
     # Удаление привязки Telegram ID к аккаунту
-    db.update_telegram_id(user[0], None)
+    await async_db.update_telegram_id(current_user[0], None)
     
     # Отправляем сообщение о выходе и кнопку для перезапуска
     await message.answer(
@@ -2,16 +2,16 @@
 
 import logging
 from aiogram import Router, F, Bot, Dispatcher
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
-from database import db
+from database import async_db
 from models import LinkStates, MessageStates
-from config import ADMIN_IDS
 from utils.keyboards import get_main_keyboard, get_admin_keyboard, get_start_keyboard, get_cancel_keyboard, get_admin_inline_keyboard
+from utils.text_commands import text_command
 from utils.helpers import send_error_message, send_success_message, cancel_state
-from utils.url_validator import validate_and_fix_url, is_valid_url, get_url_display_name
+from utils.custom_buttons import CustomButtonFilter, CustomButtonLink
 
 # Создаем роутер для пользовательских команд
 router = Router()
@@ -19,18 +19,16 @@ router = Router()
 # Исправленный импорт logger
 logger = logging.getLogger(__name__)
 
-async def check_auth(message: Message) -> bool:
+async def check_auth(message: Message, current_user: tuple | None) -> bool:
     """Проверка авторизации пользователя по сообщению"""
-    user = db.get_user_by_telegram_id(message.from_user.id)
-    if not user:
+    if not current_user:
         await send_error_message(message, "Вы не авторизованы. Используйте /login", reply_markup=get_start_keyboard())
         return False
     return True
 
-async def check_auth_callback(callback: CallbackQuery) -> bool:
+async def check_auth_callback(callback: CallbackQuery, current_user: tuple | None) -> bool:
     """Проверка авторизации пользователя по callback-запросу"""
-    user = db.get_user_by_telegram_id(callback.from_user.id)
-    if not user:
+    if not current_user:
         await callback.message.answer("❌ Вы не авторизованы. Используйте /login", reply_markup=get_start_keyboard())
         return False
     return True
@@ -39,10 +37,10 @@ async def check_auth_callback(callback: CallbackQuery) -> bool:
 # ОБРАБОТЧИКИ КНОПОК ДЛЯ ОБЫЧНЫХ ПОЛЬЗОВАТЕЛЕЙ
 # =============================================================================
 
-@router.message(F.text == "🔄 Изменить")
-async def cmd_set_link_button(message: Message, state: FSMContext):
+@text_command(router, "🔄 Изменить")
+async def cmd_set_link_button(message: Message, state: FSMContext, current_user: tuple | None):
     """Обработчик кнопки 'Изменить' для обычных пользователей"""
-    if not await check_auth(message):
+    if not await check_auth(message, current_user):
         return
     
     await message.answer(
@@ -55,14 +53,13 @@ http://ссылка|Название
     )
     await state.set_state(LinkStates.waiting_for_link)
 
-@router.message(F.text == "🔗 Моё актуальное")
-async def cmd_my_link_button(message: Message):
+@text_command(router, "🔗 Моё актуальное")
+async def cmd_my_link_button(message: Message, current_user: tuple | None):
     """Обработчик кнопки 'Моё актуальное' для обычных пользователей"""
-    if not await check_auth(message):
+    if not await check_auth(message, current_user):
         return
     
-    user = db.get_user_by_telegram_id(message.from_user.id)
-    link = user[2]
+    link = current_user[2]
     
     if link:
         await message.answer(f"🔗 Ваша текущая информация:\n{link}")
@@ -70,22 +67,22 @@ async def cmd_my_link_button(message: Message):
         await message.answer("У вас еще нет сохраненной ссылки.\nИспользуйте кнопку 'Изменить' чтобы добавить ссылку.")
     
     # Показываем клавиатуру для обычного пользователя
-    await message.answer("Выберите действие:", reply_markup=get_main_keyboard())
+    await message.answer("Выберите действие:", reply_markup=await get_main_keyboard())
 
-@router.message(F.text == "✉️ Написать сообщение")
-async def cmd_send_message_button(message: Message, state: FSMContext):
+@text_command(router, "✉️ Написать сообщение")
+async def cmd_send_message_button(message: Message, state: FSMContext, current_user: tuple | None):
     """Обработчик кнопки 'Написать сообщение' для обычных пользователей"""
-    if not await check_auth(message):
+    if not await check_auth(message, current_user):
         return
     
     # Проверяем, настроен ли канал для сообщений
-    messages_channel = db.get_channel("messages")
+    messages_channel = await async_db.get_channel("messages")
     if not messages_channel:
         await send_error_message(
             message,
             "Канал для сообщений не настроен. Обратитесь к администратору."
         )
-        await message.answer("Выберите действие:", reply_markup=get_main_keyboard())
+        await message.answer("Выберите действие:", reply_markup=await get_main_keyboard())
         return
     
     await message.answer(
@@ -94,19 +91,17 @@ async def cmd_send_message_button(message: Message, state: FSMContext):
     )
     await state.set_state(MessageStates.waiting_for_message)
 
-@router.message(F.text == "🚪 Выйти")
-async def cmd_logout_button(message: Message):
+@text_command(router, "🚪 Выйти")
+async def cmd_logout_button(message: Message, current_user: tuple | None):
     """Обработчик кнопки 'Выйти' для обычных пользователей"""
-    user = db.get_user_by_telegram_id(message.from_user.id)
-    
-    if not user:
+    if not current_user:
         await send_error_message(message, "Вы не авторизованы.")
         from utils.keyboards import get_start_button
         await message.answer("Нажмите Старт для начала работы:", reply_markup=get_start_button())
         return
     
     # Удаление привязки Telegram ID к аккаунту
-    db.update_telegram_id(user[0], None)
+    await async_db.update_telegram_id(current_user[0], None)
     
     # Отправляем сообщение о выходе и кнопку для перезапуска
     from utils.keyboards import get_start_button
@@ -120,9 +115,9 @@ async def cmd_logout_button(message: Message):
 # =============================================================================
 
 @router.message(Command("setlink"))
-async def cmd_set_link(message: Message, state: FSMContext):
+async def cmd_set_link(message: Message, state: FSMContext, current_user: tuple | None):
     """Обработчик команды /setlink"""
-    if not await check_auth(message):
+    if not await check_auth(message, current_user):
         return
     
     await message.answer(
@@ -133,17 +128,15 @@ async def cmd_set_link(message: Message, state: FSMContext):
     await state.set_state(LinkStates.waiting_for_link)
 
 @router.message(Command("mylink"))
-async def cmd_my_link(message: Message):
+async def cmd_my_link(message: Message, current_user: tuple | None, is_admin: bool):
     """Обработчик команды /mylink"""
-    if not await check_auth(message):
+    if not await check_auth(message, current_user):
         return
     
-    user = db.get_user_by_telegram_id(message.from_user.id)
-    link = user[2]
+    link = current_user[2]
     
     # Показываем соответствующую клавиатуру в зависимости от роли пользователя
-    is_admin = message.from_user.id in ADMIN_IDS
-    keyboard = get_admin_keyboard() if is_admin else get_main_keyboard()
+    keyboard = get_admin_keyboard() if is_admin else await get_main_keyboard()
 
     if link:
         await message.answer(f"🔗 Ваша текущая информация: {link}")
@@ -157,43 +150,41 @@ async def cmd_my_link(message: Message):
 # =============================================================================
 
 @router.message(LinkStates.waiting_for_link)
-async def process_link(message: Message, state: FSMContext):
+async def process_link(message: Message, state: FSMContext, current_user: tuple | None, is_admin: bool):
     """Обработка ввода ссылки"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
         
     link = message.text.strip()
-    user = db.get_user_by_telegram_id(message.from_user.id)
     
-    if not user:
+    if not current_user:
         await send_error_message(message, "Вы не авторизованы. Используйте /login")
         await state.clear()
         return
     
     # Обновление ссылки в базе данных
-    db.update_link(user[0], link)
+    await async_db.update_link(current_user[0], link)
     
     # После обновления ссылки показываем сообщение об успехе
-    is_admin = message.from_user.id in ADMIN_IDS
     if is_admin:
         # Для админа показываем сообщение и административную клавиатуру
         await send_success_message(message, f"Актуальное:\n{link}", reply_markup=get_admin_keyboard())
     else:
         # Для обычного пользователя показываем обычную клавиатуру
-        await send_success_message(message, f"Актуальное:\n{link}", reply_markup=get_main_keyboard())
+        await send_success_message(message, f"Актуальное:\n{link}", reply_markup=await get_main_keyboard())
     
     await state.clear()
     
     # Возвращаем информацию для отправки уведомления в канал
     return {
-        "username": user[1],
+        "username": current_user[1],
         "link": link
     }
 
 @router.message(MessageStates.waiting_for_message)
-async def process_user_message(message: Message, state: FSMContext, bot: Bot):
+async def process_user_message(message: Message, state: FSMContext, bot: Bot, current_user: tuple | None, is_admin: bool):
     """Обработка сообщения от пользователя"""
-    if await cancel_state(message, state):
+    if await cancel_state(message, state, current_user, is_admin):
         return
     
     user_text = message.text.strip()
@@ -201,22 +192,21 @@ async def process_user_message(message: Message, state: FSMContext, bot: Bot):
         await send_error_message(message, "Сообщение не может быть пустым")
         return
     
-    user = db.get_user_by_telegram_id(message.from_user.id)
+    user = current_user
     if not user:
         await send_error_message(message, "Пользователь не найден")
         await state.clear()
         return
     
     try:
-        messages_channel = db.get_channel("messages")
+        messages_channel = await async_db.get_channel("messages")
         if not messages_channel:
             await send_error_message(
                 message,
                 "Канал для сообщений не настроен. Обратитесь к администратору."
             )
             # Показываем соответствующую клавиатуру
-            is_admin = message.from_user.id in ADMIN_IDS
-            keyboard = get_admin_keyboard() if is_admin else get_main_keyboard()
+            keyboard = get_admin_keyboard() if is_admin else await get_main_keyboard()
             await message.answer("Выберите действие:", reply_markup=keyboard)
             await state.clear()
             return
@@ -245,8 +235,7 @@ async def process_user_message(message: Message, state: FSMContext, bot: Bot):
         )
         
         # Отправляем сообщение об успехе
-        is_admin = message.from_user.id in ADMIN_IDS
-        keyboard = get_admin_keyboard() if is_admin else get_main_keyboard()
+        keyboard = get_admin_keyboard() if is_admin else await get_main_keyboard()
         
         await send_success_message(
             message, 
@@ -258,8 +247,7 @@ async def process_user_message(message: Message, state: FSMContext, bot: Bot):
         logger.error(f"Failed to send message to channel: {e}")
         
         # Показываем соответствующую клавиатуру при ошибке
-        is_admin = message.from_user.id in ADMIN_IDS
-        keyboard = get_admin_keyboard() if is_admin else get_main_keyboard()
+        keyboard = get_admin_keyboard() if is_admin else await get_main_keyboard()
         
         await send_error_message(
             message,
@@ -274,11 +262,11 @@ async def process_user_message(message: Message, state: FSMContext, bot: Bot):
 # =============================================================================
 
 @router.callback_query(F.data == "set_link")
-async def callback_set_link(callback: CallbackQuery, state: FSMContext):
+async def callback_set_link(callback: CallbackQuery, state: FSMContext, current_user: tuple | None):
     """Обработчик инлайн-кнопки изменения ссылки (для админов)"""
     await callback.answer()
     
-    if not await check_auth_callback(callback):
+    if not await check_auth_callback(callback, current_user):
         return
     
     await callback.message.answer(
@@ -292,19 +280,19 @@ http://ссылка|Название
     await state.set_state(LinkStates.waiting_for_link)
 
 @router.callback_query(F.data == "send_message")
-async def callback_send_message(callback: CallbackQuery, state: FSMContext):
+async def callback_send_message(callback: CallbackQuery, state: FSMContext, current_user: tuple | None):
     """Обработчик инлайн-кнопки отправки сообщения (для админов)"""
     await callback.answer()
     
-    if not await check_auth_callback(callback):
+    if not await check_auth_callback(callback, current_user):
         return
     
     # Проверяем, настроен ли канал для сообщений
-    messages_channel = db.get_channel("messages")
+    messages_channel = await async_db.get_channel("messages")
     if not messages_channel:
         await callback.message.answer(
             "❌ Канал для сообщений не настроен. Обратитесь к администратору.",
-            reply_markup=get_main_keyboard()
+            reply_markup=await get_main_keyboard()
         )
         return
     
@@ -315,15 +303,14 @@ async def callback_send_message(callback: CallbackQuery, state: FSMContext):
     await state.set_state(MessageStates.waiting_for_message)
 
 @router.callback_query(F.data == "my_link")
-async def callback_my_link(callback: CallbackQuery):
+async def callback_my_link(callback: CallbackQuery, current_user: tuple | None, is_admin: bool):
     """Обработчик инлайн-кнопки просмотра ссылки (для админов)"""
     await callback.answer()
     
-    if not await check_auth_callback(callback):
+    if not await check_auth_callback(callback, current_user):
         return
     
-    user = db.get_user_by_telegram_id(callback.from_user.id)
-    link = user[2]
+    link = current_user[2]
     
     if link:
         await callback.message.answer(f"🔗 Актуальное:\n{link}")
@@ -331,7 +318,6 @@ async def callback_my_link(callback: CallbackQuery):
         await callback.message.answer("У вас еще нет сохраненной ссылки.\nИспользуйте /setlink чтобы добавить ссылку.")
     
     # Показываем соответствующие кнопки в зависимости от роли пользователя
-    is_admin = callback.from_user.id in ADMIN_IDS
     if is_admin:
         # Для админа показываем функции администрирования
         await callback.message.answer(
@@ -342,23 +328,21 @@ async def callback_my_link(callback: CallbackQuery):
         # Для обычного пользователя показываем основную клавиатуру
         await callback.message.answer(
             "Выберите действие:",
-            reply_markup=get_main_keyboard()
+            reply_markup=await get_main_keyboard()
         )
 
 @router.callback_query(F.data == "logout")
-async def callback_logout(callback: CallbackQuery):
+async def callback_logout(callback: CallbackQuery, current_user: tuple | None):
     """Обработчик инлайн-кнопки выхода (для админов)"""
     await callback.answer()
     
-    user = db.get_user_by_telegram_id(callback.from_user.id)
-    
-    if not user:
+    if not current_user:
         from utils.keyboards import get_start_button
         await callback.message.answer("❌ Вы не авторизованы.", reply_markup=get_start_button())
         return
     
     # Удаление привязки Telegram ID к аккаунту
-    db.update_telegram_id(user[0], None)
+    await async_db.update_telegram_id(current_user[0], None)
     from utils.keyboards import get_start_button
     await callback.message.answer("Вы успешно вышли из аккаунта.", reply_markup=get_start_button())
 
@@ -366,69 +350,41 @@ async def callback_logout(callback: CallbackQuery):
 # ОБРАБОТЧИК КАСТОМНЫХ КНОПОК (должен быть последним)
 # =============================================================================
 
-@router.message()
-async def handle_custom_buttons(message: Message):
-    """Обработчик кастомных кнопок - должен быть последним в цепочке обработчиков"""
-    if not await check_auth(message):
+@router.message(CustomButtonFilter())
+async def handle_custom_buttons(message: Message, custom_button: CustomButtonLink, current_user: tuple | None, is_admin: bool):
+    """Обработчик кастомных кнопок - должен быть последним в цепочке обработчиков.
+
+    Кнопка находится по названию в индексе CustomButtonFilter без запросов к базе,
+    ссылка и клавиатура подготовлены заранее.
+    """
+    if not await check_auth(message, current_user):
         return
     
-    # Получаем все активные кастомные кнопки
-    custom_buttons = db.get_custom_buttons(active_only=True)
-    
-    # Ищем кнопку с таким названием
-    for button_data in custom_buttons:
-        button_id, name, url, is_active = button_data
-        if message.text.strip() == name:
-            try:
-                # Проверяем и исправляем URL
-                fixed_url = validate_and_fix_url(url)
-                
-                if not is_valid_url(fixed_url):
-                    # Если URL невалидный, показываем текстовое сообщение
-                    await message.answer(
-                        f"🔗 {name}\n\n"
-                        f"Ссылка: {url}\n\n"
-                        f"⚠️ Некорректный формат ссылки. Обратитесь к администратору.",
-                        disable_web_page_preview=True
-                    )
-                else:
-                    # Создаем инлайн-клавиатуру с кнопкой-ссылкой
-                    display_name = get_url_display_name(fixed_url)
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text=f"🔗 Перейти в {display_name}", url=fixed_url)]
-                    ])
-                    
-                    # Отправляем сообщение с кнопкой-ссылкой
-                    await message.answer(
-                        f"🔗 {name}\n\n"
-                        f"Нажмите на кнопку ниже, чтобы перейти:",
-                        reply_markup=keyboard,
-                        disable_web_page_preview=True
-                    )
-                
-                # Показываем основную клавиатуру обратно
-                is_admin = message.from_user.id in ADMIN_IDS
-                keyboard_main = get_admin_keyboard() if is_admin else get_main_keyboard()
-                await message.answer("Выберите действие:", reply_markup=keyboard_main)
-                return
-                
-            except Exception as e:
-                logger.error(f"Error processing custom button URL: {e}")
-                # В случае ошибки показываем текстовое сообщение
-                await message.answer(
-                    f"🔗 {name}\n\n"
-                    f"Ссылка: {url}\n\n"
-                    f"⚠️ Ошибка при обработке ссылки. Обратитесь к администратору.",
-                    disable_web_page_preview=True
-                )
-                
-                # Показываем основную клавиатуру обратно
-                is_admin = message.from_user.id in ADMIN_IDS
-                keyboard_main = get_admin_keyboard() if is_admin else get_main_keyboard()
-                await message.answer("Выберите действие:", reply_markup=keyboard_main)
-                return
-    
-    # Если кнопка не найдена, не отвечаем (позволяем другим обработчикам сработать)
+    if not custom_button.is_valid:
+        # Если URL невалидный, показываем текстовое сообщение
+        await message.answer(
+            f"🔗 {custom_button.name}\n\n"
+            f"Ссылка: {custom_button.url}\n\n"
+            f"⚠️ Некорректный формат ссылки. Обратитесь к администратору.",
+            disable_web_page_preview=True
+        )
+    else:
+        # Отправляем сообщение с кнопкой-ссылкой
+        await message.answer(
+            f"🔗 {custom_button.name}\n\n"
+            f"Нажмите на кнопку ниже, чтобы перейти:",
+            reply_markup=custom_button.markup,
+            disable_web_page_preview=True
+        )
+    
+    # Показываем основную клавиатуру обратно
+    keyboard_main = get_admin_keyboard() if is_admin else await get_main_keyboard()
+    await message.answer("Выберите действие:", reply_markup=keyboard_main)
+
+@router.message()
+async def handle_unknown_message(message: Message, current_user: tuple | None):
+    """Прочие сообщения: неавторизованным подсказываем войти, остальные игнорируем"""
+    await check_auth(message, current_user)
 
 def setup(dp: Dispatcher):
     """Регистрация обработчиков пользователя"""
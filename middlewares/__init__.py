@@ -0,0 +1,12 @@
+# middlewares/__init__.py
+from .auth import AuthMiddleware
+from .request import RetryAfterMiddleware
+from utils.broadcast import broadcaster
+
+def register_all_middlewares(dp, bot):
+    """Регистрация всех middleware диспетчера и сессии бота"""
+    # Пользователь загружается один раз на апдейт до вызова любых обработчиков
+    dp.update.outer_middleware(AuthMiddleware())
+    
+    # Все исходящие запросы переживают 429 и подстраивают скорость рассылок
+    bot.session.middleware(RetryAfterMiddleware(broadcaster.limiter))
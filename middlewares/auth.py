@@ -0,0 +1,39 @@
+# middlewares/auth.py
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import ADMIN_IDS
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+class AuthMiddleware(BaseMiddleware):
+    """Загрузка пользователя из базы один раз на апдейт.
+
+    Обработчики получают строку пользователя в аргументе current_user
+    (None, если Telegram ID не привязан) и флаг is_admin.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        current_user = None
+        is_admin = False
+
+        if from_user is not None:
+            try:
+                current_user = await async_db.get_user_by_telegram_id(from_user.id)
+            except Exception as e:
+                logger.error(f"Failed to load user {from_user.id}: {e}")
+            is_admin = from_user.id in ADMIN_IDS
+
+        data["current_user"] = current_user
+        data["is_admin"] = is_admin
+        return await handler(event, data)
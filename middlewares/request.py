@@ -0,0 +1,63 @@
+# middlewares/request.py
+import os
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять запрос после ответа 429 перед тем как сдаться
+RETRY_AFTER_MAX_RETRIES = int(os.getenv("RETRY_AFTER_MAX_RETRIES", "5"))
+
+class RetryAfterMiddleware(BaseRequestMiddleware):
+    """Общий слой исходящих запросов бота.
+
+    При ответе 429 ждет retry_after и повторяет запрос в пределах лимита
+    скорости, а также сообщает о flood control ограничителю, чтобы рассылки
+    замедлились.
+    """
+
+    def __init__(self, limiter=None, max_retries=RETRY_AFTER_MAX_RETRIES):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        # Long polling не ограничивается и не влияет на скорость отправки
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        attempt = 0
+        while True:
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if self.limiter:
+                    self.limiter.on_flood(e.retry_after)
+                if attempt > self.max_retries:
+                    logger.error(f"{type(method).__name__} dropped after {self.max_retries} retries: {e}")
+                    raise
+                logger.warning(
+                    f"{type(method).__name__} hit flood control, retry {attempt}/{self.max_retries} "
+                    f"in {e.retry_after}s"
+                )
+                await asyncio.sleep(e.retry_after)
+                # Повторы идут через общий лимит, иначе все получившие 429 запросы
+                # повторятся одновременно, не учитывая сниженную скорость
+                if self.limiter:
+                    await self.limiter.acquire()
+                continue
+
+            if self.limiter:
+                self.limiter.on_success()
+            return response
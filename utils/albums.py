@@ -0,0 +1,40 @@
+# utils/albums.py
+import os
+import asyncio
+import logging
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ждать остальные части альбома после первой
+ALBUM_COLLECT_DELAY = float(os.getenv("ALBUM_COLLECT_DELAY", "1.0"))
+
+class AlbumCollector:
+    """Сборка альбома из отдельных апдейтов с общим media_group_id.
+
+    Каждая часть альбома приходит отдельным сообщением. Первое сообщение
+    группы ждет delay секунд и получает весь альбом, для остальных
+    collect возвращает None - их обработчик должен просто завершиться.
+    """
+
+    def __init__(self, delay=ALBUM_COLLECT_DELAY):
+        self.delay = delay
+        self._albums = {}
+
+    async def collect(self, message: Message) -> list[Message] | None:
+        """Добавление части альбома, возвращает альбом целиком или None"""
+        key = (message.chat.id, message.media_group_id)
+        album = self._albums.get(key)
+        if album is not None:
+            album.append(message)
+            return None
+
+        self._albums[key] = album = [message]
+        await asyncio.sleep(self.delay)
+        del self._albums[key]
+
+        album.sort(key=lambda item: item.message_id)
+        logger.info(f"Collected album {message.media_group_id} of {len(album)} messages")
+        return album
+
+album_collector = AlbumCollector()
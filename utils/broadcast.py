@@ -0,0 +1,149 @@
+# utils/broadcast.py
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from utils.ratelimit import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Параметры рассылки, могут быть переопределены через переменные окружения
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))  # сообщений в секунду (лимит Telegram ~30)
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "10"))
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1.0"))  # секунд между сообщениями в один чат
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5.0"))
+
+class ChatPacer:
+    """Минимальный интервал между сообщениями в один чат"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_slot = {}
+
+    async def wait(self, chat_id):
+        """Ожидание очередного слота для чата"""
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, now))
+        self._next_slot[chat_id] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+@dataclass
+class BroadcastStats:
+    """Счетчики и пропускная способность рассылки"""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+    @property
+    def processed(self):
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def rate(self):
+        """Отправлено сообщений в секунду"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+class BroadcastEngine:
+    """Фоновая рассылка с пулом воркеров и общим лимитом скорости.
+
+    Функция send(chat_id, throttle) вызывается для каждого получателя и
+    должна ожидать throttle(chat_id) перед каждым запросом к API.
+    Она возвращает True при успешной доставке. Необязательный
+    on_result(chat_id, delivered, error) получает результат по каждому чату,
+    где error - исключение отправки или None.
+    """
+
+    def __init__(self, rate=BROADCAST_RATE, workers=BROADCAST_WORKERS, chat_interval=BROADCAST_CHAT_INTERVAL):
+        # Скорость снижается по ответам 429 через RetryAfterMiddleware сессии бота
+        self.limiter = AdaptiveRateLimiter(rate)
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self._tasks = set()
+
+    def start(self, recipients, send, on_progress=None, on_done=None, on_result=None,
+              progress_interval=BROADCAST_PROGRESS_INTERVAL):
+        """Запуск рассылки в фоне, возвращает asyncio.Task"""
+        task = asyncio.create_task(
+            self.run(recipients, send, on_progress, on_done, on_result, progress_interval)
+        )
+        # Храним ссылку на задачу, чтобы её не собрал сборщик мусора
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run(self, recipients, send, on_progress=None, on_done=None, on_result=None,
+                  progress_interval=BROADCAST_PROGRESS_INTERVAL):
+        """Рассылка по списку Telegram ID"""
+        stats = BroadcastStats(total=len(recipients))
+        pacer = ChatPacer(self.chat_interval)
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def throttle(chat_id):
+            await pacer.wait(chat_id)
+            await self.limiter.acquire()
+
+        async def worker():
+            while True:
+                chat_id = await queue.get()
+                if chat_id is None:
+                    return
+                error = None
+                try:
+                    delivered = await send(chat_id, throttle)
+                except Exception as e:
+                    logger.error(f"Failed to send broadcast to {chat_id}: {e}")
+                    delivered = False
+                    error = e
+                if delivered:
+                    stats.sent += 1
+                else:
+                    stats.failed += 1
+                if on_result:
+                    try:
+                        await on_result(chat_id, delivered, error)
+                    except Exception as e:
+                        logger.error(f"Failed to record broadcast result for {chat_id}: {e}")
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(progress_interval)
+                try:
+                    await on_progress(stats)
+                except Exception as e:
+                    logger.warning(f"Broadcast progress callback failed: {e}")
+
+        logger.info(f"Starting broadcast to {stats.total} recipients")
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        progress_task = asyncio.create_task(reporter()) if on_progress else None
+        try:
+            for chat_id in recipients:
+                await queue.put(chat_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            if progress_task:
+                progress_task.cancel()
+            stats.finished_at = time.monotonic()
+
+        logger.info(
+            f"Broadcast completed. Sent: {stats.sent}, Failed: {stats.failed}, "
+            f"{stats.elapsed:.1f}s, {stats.rate:.1f} msg/s"
+        )
+        if on_done:
+            await on_done(stats)
+        return stats
+
+# Общий движок, чтобы параллельные рассылки делили один лимит скорости
+broadcaster = BroadcastEngine()
@@ -0,0 +1,328 @@
+# utils/broadcast_jobs.py
+import os
+import json
+import asyncio
+import logging
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.enums import ContentType
+from aiogram.types import (
+    Message, InputMediaPhoto, InputMediaVideo, InputMediaAudio, InputMediaDocument
+)
+
+from database import async_db
+from utils.broadcast import broadcaster
+
+logger = logging.getLogger(__name__)
+
+# Задания, которые сейчас выполняются в этом процессе: job_id -> (задача, буфер результатов);
+# None - задание запускается
+_active_jobs = {}
+
+# Шаблон рассылки: {text} - исходный текст или подпись с HTML-разметкой
+BROADCAST_TEMPLATE = os.getenv("BROADCAST_TEMPLATE", "<b>Сообщение от PARTNERS 🔗:</b>\n\n{text}")
+BROADCAST_HEADER = os.getenv("BROADCAST_HEADER", "<b>Сообщение от PARTNERS 🔗</b>")
+
+# Результаты доставки записываются пачками: по размеру пачки или раз в интервал (секунды)
+BROADCAST_RESULT_BATCH = int(os.getenv("BROADCAST_RESULT_BATCH", "100"))
+BROADCAST_RESULT_FLUSH_INTERVAL = float(os.getenv("BROADCAST_RESULT_FLUSH_INTERVAL", "1.0"))
+
+# Типы контента, к которым при копировании можно подставить свою подпись
+CAPTION_CONTENT_TYPES = {
+    ContentType.PHOTO,
+    ContentType.VIDEO,
+    ContentType.AUDIO,
+    ContentType.DOCUMENT,
+    ContentType.ANIMATION,
+    ContentType.VOICE,
+}
+
+def format_broadcast_text(message: Message) -> str:
+    """Текст или подпись рассылки с заголовком"""
+    text = message.html_text if (message.text or message.caption) else ""
+    return BROADCAST_TEMPLATE.format(text=text) if text else BROADCAST_HEADER
+
+async def send_broadcast_content(bot: Bot, message: Message, telegram_id, throttle, with_header=True) -> bool:
+    """Отправка контента рассылки одному получателю одним запросом.
+
+    Текст отправляется с заголовком, медиа с подписью копируются с
+    подставленной подписью, остальные типы (стикеры, видеосообщения и т.д.)
+    и режим без заголовка - простым copy_message.
+    """
+    await throttle(telegram_id)
+    
+    if with_header and message.content_type == ContentType.TEXT:
+        await bot.send_message(telegram_id, format_broadcast_text(message), parse_mode="HTML")
+    elif with_header and message.content_type in CAPTION_CONTENT_TYPES:
+        await bot.copy_message(
+            chat_id=telegram_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            caption=format_broadcast_text(message),
+            parse_mode="HTML"
+        )
+    else:
+        await bot.copy_message(
+            chat_id=telegram_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id
+        )
+    return True
+
+def get_album_media(message: Message, caption=None):
+    """InputMedia для части альбома по file_id исходного сообщения"""
+    caption = caption if caption is not None else (message.html_text if message.caption else None)
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id, caption=caption, parse_mode="HTML")
+    if message.video:
+        return InputMediaVideo(media=message.video.file_id, caption=caption, parse_mode="HTML")
+    if message.audio:
+        return InputMediaAudio(media=message.audio.file_id, caption=caption, parse_mode="HTML")
+    if message.document:
+        return InputMediaDocument(media=message.document.file_id, caption=caption, parse_mode="HTML")
+    return None
+
+async def send_broadcast_album(bot: Bot, album: list[Message], telegram_id, throttle, with_header=True) -> bool:
+    """Отправка альбома одному получателю одним запросом.
+
+    Заголовок добавляется к подписи первой части через send_media_group,
+    без заголовка альбом копируется целиком через copy_messages.
+    """
+    await throttle(telegram_id)
+    
+    if not with_header:
+        await bot.copy_messages(
+            chat_id=telegram_id,
+            from_chat_id=album[0].chat.id,
+            message_ids=[item.message_id for item in album]
+        )
+        return True
+    
+    media = [get_album_media(album[0], format_broadcast_text(album[0]))]
+    media += [get_album_media(item) for item in album[1:]]
+    if None in media:
+        return False
+    await bot.send_media_group(telegram_id, media)
+    return True
+
+def load_broadcast_content(payload: str) -> Message | list[Message]:
+    """Восстановление сообщения или альбома из сохраненного задания"""
+    if payload.lstrip().startswith("["):
+        return [Message.model_validate(item) for item in json.loads(payload)]
+    return Message.model_validate_json(payload)
+
+def get_unreachable_status(error):
+    """Статус доставки для ошибки, после которой в чат писать бесполезно"""
+    if isinstance(error, TelegramForbiddenError):
+        return "deactivated" if "deactivated" in error.message.lower() else "blocked"
+    if isinstance(error, TelegramBadRequest) and "chat not found" in error.message.lower():
+        return "not_found"
+    return None
+
+class BroadcastResultBuffer:
+    """Результаты доставки задания рассылки, записываемые в базу пачками.
+
+    Результаты копятся в памяти и сохраняются одной транзакцией, когда их
+    набирается batch_size или раз в flush_interval секунд, вместо одной-двух
+    транзакций на каждого получателя. Перед чтением итогов нужен close().
+    """
+
+    def __init__(self, job_id, batch_size=BROADCAST_RESULT_BATCH,
+                 flush_interval=BROADCAST_RESULT_FLUSH_INTERVAL):
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._results = []
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    async def add(self, telegram_id, status, error=None, delivery_status=None):
+        self._results.append((telegram_id, status, error, delivery_status))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        # Пока идет запись, результаты просто копятся до следующей пачки
+        if len(self._results) >= self.batch_size and not self._flush_lock.locked():
+            await self.flush()
+
+    async def flush(self):
+        """Запись накопленных результатов одной транзакцией"""
+        async with self._flush_lock:
+            if not self._results:
+                return
+            results, self._results = self._results, []
+            try:
+                await async_db.save_broadcast_results(self.job_id, results)
+            except Exception as e:
+                logger.error(f"Failed to save broadcast #{self.job_id} results: {e}")
+                self._results[:0] = results
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """Остановка периодической записи и запись оставшихся результатов"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+async def create_broadcast_job(content: Message | list[Message], with_header=True, **audience) -> int:
+    """Сохранение задания рассылки со снимком аудитории (фильтры iter_broadcast_audience).
+
+    content - одно сообщение или альбом, собранный AlbumCollector.
+    """
+    if isinstance(content, list):
+        payload = "[" + ",".join(item.model_dump_json(exclude_none=True) for item in content) + "]"
+        message = content[0]
+    else:
+        payload = content.model_dump_json(exclude_none=True)
+        message = content
+    return await async_db.create_broadcast_job(
+        message.chat.id,
+        message.chat.id,
+        message.message_id,
+        payload,
+        with_header=with_header,
+        **audience
+    )
+
+async def run_broadcast_job(bot: Bot, job_id) -> bool:
+    """Запуск или продолжение задания рассылки в фоне.
+
+    Отправка идет только получателям в статусе pending, поэтому после
+    перезапуска бота уже доставленные сообщения не дублируются.
+    """
+    if job_id in _active_jobs:
+        return False
+    
+    # Задание занимается до первого await, чтобы его не запустили дважды,
+    # и освобождается, если рассылка так и не стартовала
+    _active_jobs[job_id] = None
+    try:
+        started = await _start_broadcast_job(bot, job_id)
+    except BaseException:
+        _active_jobs.pop(job_id, None)
+        raise
+    if not started:
+        _active_jobs.pop(job_id, None)
+    return started
+
+async def _start_broadcast_job(bot: Bot, job_id) -> bool:
+    """Запуск задачи рассылки; освобождение задания - забота run_broadcast_job"""
+    job = await async_db.get_broadcast_job(job_id)
+    if not job:
+        return False
+    
+    _, admin_chat_id, from_chat_id, message_id, payload, status, with_header = job
+    content = load_broadcast_content(payload)
+    recipients = await async_db.get_pending_broadcast_recipients(job_id)
+    
+    await async_db.set_broadcast_job_status(job_id, "running")
+    
+    # Недоступный чат администратора не должен останавливать рассылку
+    try:
+        progress_msg = await bot.send_message(
+            admin_chat_id,
+            f"⏳ Рассылка #{job_id} запущена в фоне.\n"
+            f"👥 Получателей: {len(recipients)}"
+        )
+    except Exception as e:
+        logger.warning(f"Failed to send broadcast #{job_id} progress message: {e}")
+        progress_msg = None
+    
+    async def send(telegram_id, throttle):
+        if isinstance(content, list):
+            return await send_broadcast_album(bot, content, telegram_id, throttle, bool(with_header))
+        return await send_broadcast_content(bot, content, telegram_id, throttle, bool(with_header))
+    
+    results = BroadcastResultBuffer(job_id)
+    
+    async def on_result(telegram_id, delivered, error):
+        if delivered:
+            await results.add(telegram_id, "sent")
+            return
+        
+        # Заблокировавшие бота исключаются из следующих рассылок и из повторной отправки
+        status = get_unreachable_status(error)
+        await results.add(
+            telegram_id, "unreachable" if status else "failed",
+            str(error) if error else "Unsupported content", status
+        )
+    
+    async def on_progress(stats):
+        await progress_msg.edit_text(
+            f"⏳ Рассылка #{job_id}\n"
+            f"Обработано: {stats.processed}/{stats.total} пользователей\n"
+            f"✅ Отправлено: {stats.sent}\n"
+            f"⚡ Скорость: {stats.rate:.1f} сообщ./сек"
+        )
+    
+    async def on_done(stats):
+        await results.close()
+        await async_db.set_broadcast_job_status(job_id, "done")
+        counts = await async_db.get_broadcast_job_stats(job_id)
+        
+        # Удаляем сообщение о прогрессе
+        if progress_msg:
+            try:
+                await progress_msg.delete()
+            except Exception:
+                pass
+        
+        result_message = (
+            f"✅ 📊 Рассылка #{job_id} завершена!\n\n"
+            f"👥 Получателей: {sum(counts.values())}\n"
+            f"✅ Отправлено: {counts.get('sent', 0)}\n"
+            f"❌ Не доставлено: {counts.get('failed', 0)}\n"
+            f"🚫 Недоступны (исключены из рассылок): {counts.get('unreachable', 0)}\n"
+            f"⏱ Время: {stats.elapsed:.1f} сек ({stats.rate:.1f} сообщ./сек)"
+        )
+        if counts.get("failed"):
+            result_message += f"\n\nПовторить для недоставленных: /broadcast_retry {job_id}"
+        await bot.send_message(admin_chat_id, result_message)
+    
+    task = broadcaster.start(
+        recipients, send,
+        on_progress=on_progress if progress_msg else None,
+        on_done=on_done,
+        on_result=on_result
+    )
+    _active_jobs[job_id] = (task, results)
+    task.add_done_callback(lambda _: _active_jobs.pop(job_id, None))
+    return True
+
+async def retry_broadcast_job(bot: Bot, job_id) -> int | None:
+    """Повторная отправка только недоставленным получателям задания"""
+    if job_id in _active_jobs or not await async_db.get_broadcast_job(job_id):
+        return None
+    
+    count = await async_db.reset_failed_broadcast_recipients(job_id)
+    if count:
+        await run_broadcast_job(bot, job_id)
+    return count
+
+async def resume_broadcast_jobs(bot: Bot):
+    """Продолжение заданий рассылки, прерванных перезапуском бота"""
+    for job_id in await async_db.get_unfinished_broadcast_jobs():
+        try:
+            logger.info(f"Resuming broadcast job {job_id}")
+            await run_broadcast_job(bot, job_id)
+        except Exception as e:
+            logger.error(f"Failed to resume broadcast job {job_id}: {e}")
+
+async def stop_broadcast_jobs():
+    """Остановка выполняющихся рассылок с записью накопленных результатов.
+
+    Вызывается до закрытия базы данных. Задания остаются в статусе running
+    и продолжаются после перезапуска только для получателей без результата.
+    """
+    jobs = [job for job in _active_jobs.values() if job]
+    for task, _ in jobs:
+        task.cancel()
+    await asyncio.gather(*(task for task, _ in jobs), return_exceptions=True)
+    for _, results in jobs:
+        await results.close()
+    if jobs:
+        logger.info(f"Stopped {len(jobs)} broadcast job(s)")
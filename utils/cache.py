@@ -0,0 +1,91 @@
+# utils/cache.py
+import time
+import threading
+from collections import OrderedDict
+
+# Маркер отсутствия значения в кэше (None - допустимое закэшированное значение)
+MISSING = object()
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш ограниченного размера.
+
+    Поле generation увеличивается при каждой инвалидации: значение,
+    прочитанное из базы до инвалидации, не попадет в кэш после нее.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """Получение значения с обновлением порядка использования"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """Сохранение значения; устаревшее поколение игнорируется"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, *keys):
+        """Удаление значений по ключам"""
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class TTLCache:
+    """Потокобезопасный кэш, значения которого устаревают через ttl секунд"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """Получение значения, если оно еще не устарело"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def put(self, key, value):
+        """Сохранение значения на ttl секунд"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._data.clear()
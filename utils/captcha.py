@@ -1,54 +1,160 @@
 import os
+import math
+import time
 import random
 import string
+import logging
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 
+CAPTCHA_ALPHABET = string.ascii_uppercase + string.digits
+CAPTCHA_WIDTH = 200
+CAPTCHA_HEIGHT = 80
+CAPTCHA_FONT_SIZE = 45
+# Share of noise pixels: ~1000 dots on a 200x80 image, as before
+CAPTCHA_NOISE_THRESHOLD = 16  # of 256
+
+# Output encoders to try, comma separated, fastest first ("auto" = all of them)
+CAPTCHA_FORMAT = os.getenv("CAPTCHA_FORMAT", "png")
+# Byte budget: the first encoder whose output fits wins (0 = no budget)
+CAPTCHA_MAX_BYTES = int(os.getenv("CAPTCHA_MAX_BYTES", "0"))
+CAPTCHA_JPEG_QUALITY = int(os.getenv("CAPTCHA_JPEG_QUALITY", "70"))
+CAPTCHA_WEBP_QUALITY = int(os.getenv("CAPTCHA_WEBP_QUALITY", "70"))
+CAPTCHA_PALETTE_COLORS = int(os.getenv("CAPTCHA_PALETTE_COLORS", "4"))
+
+logger = logging.getLogger(__name__)
+
 def generate_captcha_text(length=5):
     """Generate random text for captcha"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+    return ''.join(random.choices(CAPTCHA_ALPHABET, k=length))
 
-def generate_captcha_image(text):
-    """Generate captcha image from text"""
-    # Create image with white background
-    width = 200
-    height = 80
+@lru_cache(maxsize=None)
+def get_captcha_font(size=CAPTCHA_FONT_SIZE):
+    """Load the captcha font once per size"""
+    try:
+        # Try to use Arial font if available
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        # Fallback to default font
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=None)
+def get_glyph_sprite(char, size=CAPTCHA_FONT_SIZE):
+    """Pre-rendered glyph mask and its advance width"""
+    font = get_captcha_font(size)
+    advance = font.getlength(char)
+    _, _, right, bottom = font.getbbox(char)
+    sprite = Image.new('L', (max(1, math.ceil(max(advance, right))), max(1, bottom)), 0)
+    ImageDraw.Draw(sprite).text((0, 0), char, font=font, fill=255)
+    return sprite, advance
+
+def make_noise_mask(width, height):
+    """Random dot mask built in one pass from os.urandom instead of a per-pixel loop"""
+    noise = Image.frombytes('L', (width, height), os.urandom(width * height))
+    return noise.point(lambda value: 255 if value < CAPTCHA_NOISE_THRESHOLD else 0)
+
+def _save_png(image, buffer):
+    image.save(buffer, format='PNG')
+
+def _save_png_optimize(image, buffer):
+    image.save(buffer, format='PNG', optimize=True)
+
+def _save_png_palette(image, buffer):
+    palette = image.convert('P', palette=Image.Palette.ADAPTIVE, colors=CAPTCHA_PALETTE_COLORS)
+    palette.save(buffer, format='PNG', optimize=True)
+
+def _save_webp(image, buffer):
+    image.save(buffer, format='WEBP', quality=CAPTCHA_WEBP_QUALITY)
+
+def _save_jpeg(image, buffer):
+    image.save(buffer, format='JPEG', quality=CAPTCHA_JPEG_QUALITY)
+
+# name -> (save function, file extension), ordered by encode speed on a 200x80 captcha
+CAPTCHA_ENCODERS = {
+    'jpeg': (_save_jpeg, 'jpg'),
+    'png': (_save_png, 'png'),
+    'webp': (_save_webp, 'webp'),
+    'png_palette': (_save_png_palette, 'png'),
+    'png_optimize': (_save_png_optimize, 'png'),
+}
+
+def get_captcha_encoders(formats=CAPTCHA_FORMAT):
+    """Encoder names from a comma separated setting"""
+    if formats.strip().lower() == 'auto':
+        return list(CAPTCHA_ENCODERS)
+    names = [name.strip().lower() for name in formats.split(',') if name.strip()]
+    unknown = [name for name in names if name not in CAPTCHA_ENCODERS]
+    if unknown:
+        raise ValueError(f"Unknown captcha format(s): {', '.join(unknown)}")
+    return names or ['png']
+
+def encode_captcha(image, formats=CAPTCHA_FORMAT, max_bytes=CAPTCHA_MAX_BYTES):
+    """Encode the image with the first encoder that fits the byte budget.
+
+    Returns (data, extension). If nothing fits, the smallest result is used.
+    """
+    best = None
+    for name in get_captcha_encoders(formats):
+        save, extension = CAPTCHA_ENCODERS[name]
+        started = time.perf_counter()
+        buffer = BytesIO()
+        save(image, buffer)
+        data = buffer.getvalue()
+        logger.debug(
+            f"Captcha encoded as {name}: {len(data)} bytes in "
+            f"{(time.perf_counter() - started) * 1000:.2f} ms"
+        )
+        if best is None or len(data) < len(best[0]):
+            best = (data, extension)
+        if not max_bytes or len(data) <= max_bytes:
+            return data, extension
+
+    logger.warning(f"No captcha encoder fits {max_bytes} bytes, using {len(best[0])} bytes")
+    return best
+
+def render_captcha(text):
+    """Render the captcha image from text"""
+    width = CAPTCHA_WIDTH
+    height = CAPTCHA_HEIGHT
     image = Image.new('RGB', (width, height), color='white')
-    draw = ImageDraw.Draw(image)
-    
+
     # Add noise (random dots)
-    for _ in range(1000):
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        draw.point((x, y), fill='gray')
-    
+    image.paste('gray', (0, 0), make_noise_mask(width, height))
+
     # Add lines for noise
+    draw = ImageDraw.Draw(image)
     for _ in range(5):
         x1 = random.randint(0, width)
         y1 = random.randint(0, height)
         x2 = random.randint(0, width)
         y2 = random.randint(0, height)
         draw.line([(x1, y1), (x2, y2)], fill='gray', width=1)
-    
-    # Calculate font size and position
-    font_size = 45
-    try:
-        # Try to use Arial font if available
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except:
-        # Fallback to default font
-        font = ImageFont.load_default()
-    
-    # Calculate text size and position
-    text_width = font.getlength(text)
-    text_x = (width - text_width) // 2
-    text_y = (height - font_size) // 2
-    
-    # Add text to image
-    draw.text((text_x, text_y), text, font=font, fill='black')
-    
-    # Return image as bytes
-    img_byte_array = BytesIO()
-    image.save(img_byte_array, format='PNG')
-    img_byte_array.seek(0)
-    return img_byte_array.getvalue()
+
+    # Stamp cached glyph sprites centered on the image
+    glyphs = [get_glyph_sprite(char) for char in text]
+    text_width = sum(advance for _, advance in glyphs)
+    text_x = (width - text_width) / 2
+    text_y = (height - CAPTCHA_FONT_SIZE) // 2
+    for sprite, advance in glyphs:
+        image.paste('black', (int(text_x), text_y), sprite)
+        text_x += advance
+
+    return image
+
+def generate_captcha_image(text):
+    """Generate captcha image from text, encoded per CAPTCHA_FORMAT"""
+    data, _ = encode_captcha(render_captcha(text))
+    return data
+
+def generate_captcha():
+    """Generate captcha text, image bytes, file name and encode time in seconds.
+
+    Used by the captcha pool workers; the encode time is returned so the
+    parent process can report it (worker logs do not reach the bot's log).
+    """
+    text = generate_captcha_text()
+    image = render_captcha(text)
+    started = time.perf_counter()
+    data, extension = encode_captcha(image)
+    return text, data, f"captcha.{extension}", time.perf_counter() - started
@@ -0,0 +1,109 @@
+# utils/captcha_pool.py
+import os
+import random
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.captcha import generate_captcha, get_captcha_encoders
+
+logger = logging.getLogger(__name__)
+
+# Размер пула готовых капч, порог дозаполнения и число процессов-генераторов
+CAPTCHA_POOL_SIZE = int(os.getenv("CAPTCHA_POOL_SIZE", "50"))
+CAPTCHA_POOL_LOW_WATER = int(os.getenv("CAPTCHA_POOL_LOW_WATER", "20"))
+CAPTCHA_WORKERS = int(os.getenv("CAPTCHA_WORKERS", "2"))
+
+class CaptchaPool:
+    """Пул заранее сгенерированных капч (текст, картинка, имя файла).
+
+    get() отдает готовую капчу без работы в цикле событий. Когда в пуле
+    остается меньше low_water капч, фоновая задача дозаполняет его до size
+    в пуле процессов. Каждая капча выдается только один раз.
+    """
+
+    def __init__(self, size=CAPTCHA_POOL_SIZE, low_water=CAPTCHA_POOL_LOW_WATER, workers=CAPTCHA_WORKERS):
+        self.size = size
+        self.low_water = min(low_water, size)
+        self.workers = workers
+        self._ready = deque()
+        self._executor = None
+        self._refill_task = None
+        self._refill_needed = asyncio.Event()
+
+    def start(self):
+        """Запуск процессов-генераторов и фонового дозаполнения.
+
+        Выбрасывает ValueError, если в CAPTCHA_FORMAT указан неизвестный формат.
+        """
+        if self._refill_task:
+            return
+        # Неверный CAPTCHA_FORMAT иначе проявится только в процессах-генераторах
+        # бесконечными ошибками дозаполнения - останавливаем запуск сразу
+        get_captcha_encoders()
+        # Без пересева дочерние процессы унаследуют одно состояние random
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=random.seed)
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        self._refill_needed.set()
+
+    async def stop(self):
+        """Остановка дозаполнения и пула процессов"""
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._ready.clear()
+
+    async def get(self) -> tuple[str, bytes, str]:
+        """Готовая капча; если пул пуст, генерируется вне цикла событий"""
+        if len(self._ready) <= self.low_water:
+            self._refill_needed.set()
+        if self._ready:
+            return self._ready.popleft()
+
+        logger.warning("Captcha pool is empty, generating on demand")
+        text, data, filename, _ = await self._generate()
+        return text, data, filename
+
+    async def _generate(self):
+        """Капча из процесса-генератора: (текст, картинка, имя файла, время кодирования)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, generate_captcha)
+
+    async def _refill_loop(self):
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+            # Размер и время кодирования измеряются в процессах-генераторах
+            # и собираются здесь, потому что их логи в лог бота не попадают
+            generated = 0
+            encoded_bytes = 0
+            encode_time = 0.0
+            while len(self._ready) < self.size:
+                batch = min(self.size - len(self._ready), self.workers * 2)
+                try:
+                    captchas = await asyncio.gather(*(self._generate() for _ in range(batch)))
+                except Exception as e:
+                    logger.error(f"Failed to refill captcha pool: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for text, data, filename, elapsed in captchas:
+                    self._ready.append((text, data, filename))
+                    encoded_bytes += len(data)
+                    encode_time += elapsed
+                generated += len(captchas)
+            if generated:
+                logger.info(
+                    f"Captcha pool refilled to {len(self._ready)}: {generated} generated, "
+                    f"average size {encoded_bytes / generated:.0f} bytes, "
+                    f"average encode time {encode_time / generated * 1000:.2f} ms"
+                )
+
+captcha_pool = CaptchaPool()
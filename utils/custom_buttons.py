@@ -0,0 +1,83 @@
+# utils/custom_buttons.py
+import asyncio
+import logging
+from dataclasses import dataclass
+from aiogram.filters import Filter
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+
+from database import async_db, db
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CustomButtonLink:
+    """Кастомная кнопка с подготовленной при сохранении ссылкой"""
+    id: int
+    name: str
+    url: str
+    normalized_url: str
+    is_valid: bool
+    display_name: str
+    markup: InlineKeyboardMarkup | None
+
+    @classmethod
+    def from_row(cls, row):
+        button_id, name, url, normalized_url, is_valid, display_name = row
+        markup = None
+        if is_valid:
+            markup = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=f"🔗 Перейти в {display_name}", url=normalized_url)]
+            ])
+        return cls(button_id, name, url, normalized_url, bool(is_valid), display_name, markup)
+
+class CustomButtonIndex:
+    """Индекс активных кастомных кнопок по названию.
+
+    Перестраивается из базы только при изменении db.buttons_version,
+    поэтому поиск кнопки по тексту сообщения обходится без запросов к SQLite.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._buttons = {}
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self):
+        version = db.buttons_version
+        if version == self._version:
+            return
+        async with self._lock:
+            if version == self._version:
+                return
+            rows = await async_db.get_custom_button_links()
+            buttons = {}
+            for row in rows:
+                try:
+                    # При повторе названия побеждает первая кнопка, как при обходе по порядку
+                    buttons.setdefault(row[1], CustomButtonLink.from_row(row))
+                except Exception as e:
+                    logger.error(f"Invalid custom button {row[0]}: {e}")
+            self._buttons = buttons
+            self._version = version
+            logger.debug(f"Custom button index rebuilt: {len(self._buttons)} buttons")
+
+    async def get(self, name):
+        """CustomButtonLink по названию или None"""
+        await self._refresh()
+        return self._buttons.get(name)
+
+custom_button_index = CustomButtonIndex()
+
+class CustomButtonFilter(Filter):
+    """Фильтр сообщений с названием активной кастомной кнопки.
+
+    Передает найденную кнопку в обработчик как custom_button.
+    """
+
+    async def __call__(self, message: Message) -> bool | dict:
+        if not message.text:
+            return False
+        button = await custom_button_index.get(message.text.strip())
+        if button is None:
+            return False
+        return {"custom_button": button}
@@ -0,0 +1,48 @@
+# utils/export.py
+import io
+import csv
+import gzip
+import logging
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX-выгрузка необязательна
+    Workbook = None
+
+logger = logging.getLogger(__name__)
+
+USER_EXPORT_COLUMNS = ["id", "username", "password", "telegram_id", "link", "full_name", "delivery_status"]
+
+def xlsx_available() -> bool:
+    """Установлен ли openpyxl для выгрузки в XLSX"""
+    return Workbook is not None
+
+def export_users_csv_gz(rows) -> bytes:
+    """Сжатый CSV из потока строк пользователей.
+
+    Строки пишутся в gzip по одной, поэтому в памяти держится только
+    сжатый результат, а не весь список пользователей.
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as archive:
+        # utf-8-sig - чтобы Excel правильно открыл кириллицу
+        with io.TextIOWrapper(archive, encoding="utf-8-sig", newline="") as text:
+            writer = csv.writer(text)
+            writer.writerow(USER_EXPORT_COLUMNS)
+            writer.writerows(rows)
+    return buffer.getvalue()
+
+def export_users_xlsx(rows) -> bytes:
+    """XLSX из потока строк пользователей (режим write_only openpyxl)"""
+    if Workbook is None:
+        raise RuntimeError("openpyxl is not installed")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("users")
+    sheet.append(USER_EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(list(row))
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
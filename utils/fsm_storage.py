@@ -0,0 +1,168 @@
+# utils/fsm_storage.py
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+logger = logging.getLogger(__name__)
+
+# Время жизни брошенного состояния, период записи изменений и период очистки (секунды)
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(24 * 60 * 60)))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "300"))
+# Сколько секунд неиспользуемое состояние держится в памяти (в базе оно остается до TTL)
+FSM_MEMORY_TTL = float(os.getenv("FSM_MEMORY_TTL", "600"))
+
+class _Record:
+    __slots__ = ("state", "data", "expires_at", "accessed_at")
+
+    def __init__(self, state=None, data=None, expires_at=0.0):
+        self.state = state
+        self.data = data or {}
+        self.expires_at = expires_at
+        self.accessed_at = time.monotonic()
+
+    @property
+    def empty(self):
+        return self.state is None and not self.data
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM aiogram в SQLite (таблица fsm_storage).
+
+    Изменения сначала попадают в память и записываются в базу пачкой раз
+    в flush_interval секунд, поэтому несколько set_state/set_data за один
+    апдейт дают одну запись. Каждое изменение продлевает жизнь состояния
+    на ttl секунд; фоновая очистка удаляет истекшие состояния из базы и
+    давно не используемые - из памяти. Состояния переживают перезапуск бота.
+    """
+
+    def __init__(self, database, ttl=FSM_STATE_TTL, flush_interval=FSM_FLUSH_INTERVAL,
+                 sweep_interval=FSM_SWEEP_INTERVAL, memory_ttl=FSM_MEMORY_TTL):
+        # database - AsyncDatabase
+        self.database = database
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.memory_ttl = memory_ttl
+        self._records: Dict[str, _Record] = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._sweep_task = None
+        self._flush_lock = asyncio.Lock()
+
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _start_tasks(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def _get_record(self, key: StorageKey) -> _Record:
+        key = self._make_key(key)
+        record = self._records.get(key)
+        if record is None:
+            row = await self.database.get_fsm_record(key)
+            loaded = _Record()
+            if row and row[2] > time.time():
+                state, data, expires_at = row
+                loaded = _Record(state, json.loads(data) if data else {}, expires_at)
+            # Пока шло чтение, ключ мог быть записан - запись в памяти новее
+            record = self._records.setdefault(key, loaded)
+        elif record.expires_at and record.expires_at <= time.time():
+            record.state, record.data, record.expires_at = None, {}, 0.0
+        record.accessed_at = time.monotonic()
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record):
+        record.expires_at = time.time() + self.ttl
+        record.accessed_at = time.monotonic()
+        self._dirty.add(self._make_key(key))
+        self._start_tasks()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get_record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get_record(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(key)).data.copy()
+
+    async def flush(self):
+        """Запись накопленных изменений в базу одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            records = []
+            deleted = []
+            for key in keys:
+                record = self._records.get(key)
+                if record is None or record.empty:
+                    deleted.append(key)
+                    continue
+                try:
+                    data = json.dumps(record.data, ensure_ascii=False)
+                except (TypeError, ValueError) as e:
+                    # Такие данные не записать никогда - не блокируем остальные состояния
+                    logger.error(f"FSM data for {key} is not JSON serializable, skipped: {e}")
+                    continue
+                records.append((key, record.state, data, record.expires_at))
+            try:
+                await self.database.save_fsm_records(records, deleted)
+            except Exception as e:
+                logger.error(f"Failed to save FSM states: {e}")
+                self._dirty |= keys
+                return
+            # Очищенные состояния больше не нужно держать в памяти
+            for key in deleted:
+                record = self._records.get(key)
+                if record is not None and record.empty and key not in self._dirty:
+                    del self._records[key]
+
+    async def sweep(self):
+        """Удаление истекших состояний из базы и неиспользуемых - из памяти"""
+        removed = await self.database.delete_expired_fsm_records(time.time())
+        idle_before = time.monotonic() - self.memory_ttl
+        for key in [key for key, record in self._records.items()
+                    if record.accessed_at < idle_before and key not in self._dirty]:
+            del self._records[key]
+        if removed:
+            logger.info(f"Removed {removed} expired FSM states")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"FSM storage flush failed: {e}")
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"FSM storage sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def close(self) -> None:
+        for task in (self._flush_task, self._sweep_task):
+            if task:
+                task.cancel()
+        self._flush_task = self._sweep_task = None
+        await self.flush()
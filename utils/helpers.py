@@ -13,20 +13,16 @@ async def check_admin(message: types.Message) -> bool:
         return False
     return True
 
-async def cancel_state(message: types.Message, state: FSMContext) -> bool:
-    """Обработка отмены операции"""
+async def cancel_state(message: types.Message, state: FSMContext, current_user, is_admin: bool) -> bool:
+    """Обработка отмены операции (current_user и is_admin передаются AuthMiddleware)"""
     if message.text == "❌ Отмена":
         await state.clear()  # Clear state first to ensure no more state handlers run
         
-        # Проверяем, авторизован ли пользователь
-        from database import db  # Import here to avoid circular imports
         from aiogram.types import ReplyKeyboardRemove
-        user = db.get_user_by_telegram_id(message.from_user.id)
         
-        if user:
+        # Проверяем, авторизован ли пользователь
+        if current_user:
             # Пользователь авторизован
-            is_admin = message.from_user.id in ADMIN_IDS
-            
             if is_admin:
                 # Для админа отправляем сообщение с кнопками администрирования
                 await message.answer(
@@ -38,7 +34,7 @@ async def cancel_state(message: types.Message, state: FSMContext) -> bool:
                 await message.answer("Действие отменено.", reply_markup=ReplyKeyboardRemove())
                 # Затем отправляем инлайн клавиатуру
                 from utils.keyboards import get_main_keyboard
-                await message.answer("Выберите действие:", reply_markup=get_main_keyboard())
+                await message.answer("Выберите действие:", reply_markup=await get_main_keyboard())
         else:
             # Если не авторизован - сначала убираем reply клавиатуру, затем отправляем инлайн кнопку
             from utils.keyboards import get_start_button
@@ -53,7 +49,7 @@ def format_user_list(users: list) -> str:
     if not users:
         return "Список пользователей пуст."
     
-    # Для отображения более 5 пользователей используем send_user_list_in_parts
+    # Для отображения более 5 пользователей используем постраничный список /admin
     if len(users) > 5:
         return f"📊 Найдено пользователей: {len(users)}\n\n⚠️ Используется разбивка на части."
     
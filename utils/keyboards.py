@@ -1,9 +1,11 @@
 # utils/keyboards.py с отладкой
 import logging
+from functools import lru_cache
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
 def get_start_keyboard():
     """Клавиатура для неавторизованных пользователей"""
     kb = [
@@ -11,6 +13,7 @@ def get_start_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_start_button():
     """Инлайн-клавиатура с кнопкой Старт для неавторизованных пользователей"""
     kb = [
@@ -18,6 +21,7 @@ def get_start_button():
     ]
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+@lru_cache(maxsize=None)
 def get_auth_keyboard():
     """Клавиатура для выбора между авторизацией и регистрацией"""
     kb = [
@@ -25,11 +29,24 @@ def get_auth_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
-def get_main_keyboard():
-    """Обычная клавиатура для авторизованных пользователей с кастомными кнопками"""
+# Основная клавиатура: (версия кнопок, разметка)
+_main_keyboard_cache = (None, None)
+
+async def get_main_keyboard():
+    """Обычная клавиатура для авторизованных пользователей с кастомными кнопками.
+
+    Клавиатура строится заново только при изменении кнопок (db.buttons_version),
+    кнопки при этом читаются через async_db, не блокируя цикл событий.
+    """
+    global _main_keyboard_cache
     try:
         # Импортируем здесь, чтобы избежать циклического импорта
-        from database import db
+        from database import db, async_db
+        
+        version = db.buttons_version
+        cached_version, cached_keyboard = _main_keyboard_cache
+        if cached_version == version:
+            return cached_keyboard
         
         # Базовые кнопки
         kb = [
@@ -39,8 +56,8 @@ def get_main_keyboard():
         
         # Добавляем кастомные кнопки
         try:
-            custom_buttons = db.get_custom_buttons(active_only=True)
-            logger.info(f"Found {len(custom_buttons)} custom buttons")
+            custom_buttons = await async_db.get_custom_buttons(active_only=True)
+            logger.debug(f"Found {len(custom_buttons)} custom buttons")
             
             # Группируем кастомные кнопки по 2 в строке
             custom_rows = []
@@ -49,7 +66,7 @@ def get_main_keyboard():
             for button_data in custom_buttons:
                 button_name = button_data[1]  # name
                 current_row.append(KeyboardButton(text=button_name))
-                logger.info(f"Added custom button: {button_name}")
+                logger.debug(f"Added custom button: {button_name}")
                 
                 # Если в строке уже 2 кнопки, добавляем строку и начинаем новую
                 if len(current_row) == 2:
@@ -66,7 +83,8 @@ def get_main_keyboard():
         except Exception as e:
             logger.error(f"Error getting custom buttons: {e}")
             # Если возникла ошибка с базой данных, просто пропускаем кастомные кнопки
-            pass
+            # и не кэшируем неполную клавиатуру
+            version = None
         
         # Кнопка выхода в конце
         kb.append([KeyboardButton(text='🚪 Выйти')])
@@ -79,6 +97,7 @@ def get_main_keyboard():
         )
         
         logger.info(f"Created main keyboard with {len(kb)} rows")
+        _main_keyboard_cache = (version, keyboard)
         return keyboard
         
     except Exception as e:
@@ -96,6 +115,7 @@ def get_main_keyboard():
             is_persistent=True
         )
 
+@lru_cache(maxsize=None)
 def get_admin_inline_keyboard():
     """Инлайн-клавиатура для базовых действий администраторов"""
     kb = [
@@ -108,6 +128,7 @@ def get_admin_inline_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+@lru_cache(maxsize=None)
 def get_admin_keyboard():
     """Обычная клавиатура для функций администрирования"""
     kb = [
@@ -125,6 +146,18 @@ def get_admin_keyboard():
         is_persistent=True
     )
 
+def get_users_page_keyboard(first_id, last_id, has_prev, has_next):
+    """Инлайн-навигация по страницам списка пользователей"""
+    row = []
+    if has_prev:
+        row.append(InlineKeyboardButton(text='⏮', callback_data='users_page:first'))
+        row.append(InlineKeyboardButton(text='◀️', callback_data=f'users_page:prev:{first_id}'))
+    if has_next:
+        row.append(InlineKeyboardButton(text='▶️', callback_data=f'users_page:next:{last_id}'))
+        row.append(InlineKeyboardButton(text='⏭', callback_data='users_page:last'))
+    return InlineKeyboardMarkup(inline_keyboard=[row] if row else [])
+
+@lru_cache(maxsize=None)
 def get_button_management_keyboard():
     """Клавиатура для управления кастомными кнопками"""
     kb = [
@@ -140,6 +173,7 @@ def get_button_management_keyboard():
         is_persistent=True
     )
 
+@lru_cache(maxsize=None)
 def get_button_edit_keyboard():
     """Клавиатура для выбора что изменить в кнопке"""
     kb = [
@@ -148,6 +182,7 @@ def get_button_edit_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_user_action_keyboard():
     """Клавиатура для выбора действия с пользователем"""
     kb = [
@@ -156,6 +191,7 @@ def get_user_action_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_cancel_keyboard():
     """Клавиатура только с кнопкой отмены"""
     kb = [
@@ -0,0 +1,88 @@
+# utils/media.py
+import os
+import asyncio
+import hashlib
+import logging
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from database import async_db
+
+logger = logging.getLogger(__name__)
+
+WELCOME_LOGO_PATH = "assets/logo.jpg"
+
+def hash_file(path) -> str:
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MediaRegistry:
+    """Отправка статических файлов по file_id Telegram.
+
+    Файл загружается один раз, полученный file_id сохраняется в таблице
+    media_cache по хэшу содержимого. Изменившийся файл получает новый хэш
+    и загружается заново. Хэш пересчитывается только при смене mtime/размера.
+    """
+
+    def __init__(self):
+        self._hashes = {}  # path -> ((mtime_ns, size), file_hash)
+        self._file_ids = {}  # file_hash -> file_id
+        self._locks = {}
+
+    async def _get_hash(self, path):
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        file_hash = await asyncio.to_thread(hash_file, path)
+        self._hashes[path] = (key, file_hash)
+        return file_hash
+
+    async def _get_file_id(self, file_hash):
+        file_id = self._file_ids.get(file_hash)
+        if file_id is None:
+            file_id = await async_db.get_media_file_id(file_hash)
+            if file_id:
+                self._file_ids[file_hash] = file_id
+        return file_id
+
+    async def _forget(self, file_hash):
+        self._file_ids.pop(file_hash, None)
+        await async_db.delete_media_file_id(file_hash)
+
+    async def send_photo(self, bot: Bot, chat_id, path, **kwargs) -> Message:
+        """Отправка фото по file_id с загрузкой файла только при первом использовании"""
+        file_hash = await self._get_hash(path)
+
+        file_id = await self._get_file_id(file_hash)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id, file_id, **kwargs)
+            except TelegramBadRequest as e:
+                # Ошибки разметки подписи и т.п. не связаны с file_id
+                if "file" not in e.message.lower():
+                    raise
+                logger.warning(f"Cached file_id for {path} is invalid, uploading again: {e}")
+                await self._forget(file_hash)
+
+        # Одновременные первые отправки не должны загружать файл несколько раз
+        lock = self._locks.setdefault(file_hash, asyncio.Lock())
+        async with lock:
+            file_id = await self._get_file_id(file_hash)
+            if file_id:
+                return await bot.send_photo(chat_id, file_id, **kwargs)
+
+            result = await bot.send_photo(chat_id, FSInputFile(path), **kwargs)
+            file_id = result.photo[-1].file_id
+            await async_db.set_media_file_id(file_hash, path, file_id)
+            self._file_ids[file_hash] = file_id
+            logger.info(f"Uploaded {path}, file_id cached")
+            return result
+
+media_registry = MediaRegistry()
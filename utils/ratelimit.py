@@ -0,0 +1,77 @@
+# utils/ratelimit.py
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Глобальный ограничитель скорости отправки.
+
+    Токены резервируются сразу, поэтому конкурентные воркеры
+    выстраиваются в очередь без блокировки.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        """Ожидание свободного токена"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket со скоростью, подстраиваемой по ответам Telegram (AIMD).
+
+    Успешные запросы увеличивают скорость на increase сообщений в секунду
+    не чаще раза в increase_interval, ответ 429 умножает её на decrease
+    и приостанавливает выдачу токенов на retry_after секунд.
+    """
+
+    def __init__(self, rate, min_rate=1.0, max_rate=None, increase=1.0, decrease=0.5, increase_interval=1.0):
+        super().__init__(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.decrease = decrease
+        self.increase_interval = increase_interval
+        self._paused_until = 0.0
+        self._last_change = time.monotonic()
+
+    def _set_rate(self, rate):
+        self.rate = rate
+        # Размер всплеска не превышает секундную норму
+        self.capacity = max(1.0, rate)
+        self._last_change = time.monotonic()
+
+    def on_success(self):
+        """Аддитивное увеличение скорости после успешного запроса"""
+        if self.rate >= self.max_rate:
+            return
+        if time.monotonic() - self._last_change >= self.increase_interval:
+            self._set_rate(min(self.max_rate, self.rate + self.increase))
+
+    def on_flood(self, retry_after):
+        """Мультипликативное снижение скорости после ответа 429"""
+        self._set_rate(max(self.min_rate, self.rate * self.decrease))
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self._tokens = min(self._tokens, 0)
+        logger.warning(f"Flood control: pausing for {retry_after}s, send rate lowered to {self.rate:.1f} msg/s")
+
+    async def acquire(self):
+        """Ожидание окончания паузы flood control и свободного токена"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await super().acquire()
+            # Пока воркер ждал токен, мог прийти 429: тогда ждем паузу и берем токен заново
+            if self._paused_until <= time.monotonic():
+                return
@@ -0,0 +1,67 @@
+# utils/text_commands.py
+import logging
+from aiogram import Router, F
+from aiogram.filters import Filter
+from aiogram.types import Message
+from aiogram.dispatcher.event.handler import CallableObject
+
+logger = logging.getLogger(__name__)
+
+async def in_state(message: Message, raw_state: str | None = None) -> bool:
+    """Фильтр: у пользователя есть активное состояние FSM"""
+    return raw_state is not None
+
+class TextCommandRegistry:
+    """Реестр кнопок обычной клавиатуры: текст кнопки -> обработчик.
+
+    Без активного состояния FSM сообщение с текстом кнопки находится одним
+    поиском в словаре в отдельном роутере, который подключается первым.
+    В состояниях FSM обработчик срабатывает из своего роутера через
+    F.text == label, поэтому порядок относительно обработчиков состояний
+    остается прежним. При повторе текста срабатывает первый
+    зарегистрированный обработчик, как и при обходе роутеров по порядку.
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self.router = Router(name="text_commands")
+        self.router.message(TextCommandFilter(self))(self._dispatch)
+
+    def __call__(self, router: Router, label: str):
+        """Декоратор: регистрация обработчика кнопки label в router и в реестре"""
+        def decorator(callback):
+            router.message(in_state, F.text == label)(callback)
+            if label in self._commands:
+                logger.debug(f"Text command {label!r} is already handled, keeping the first handler")
+            else:
+                self._commands[label] = CallableObject(callback)
+            return callback
+        return decorator
+
+    def get(self, text):
+        """Обработчик кнопки по тексту сообщения или None"""
+        return self._commands.get(text)
+
+    def __len__(self):
+        return len(self._commands)
+
+    @staticmethod
+    async def _dispatch(message: Message, text_command: CallableObject, **data):
+        # Данные обработчика (state, bot, current_user...) отбираются по его сигнатуре
+        return await text_command.call(message, **data)
+
+class TextCommandFilter(Filter):
+    """Совпадение текста сообщения с кнопкой из реестра вне состояний FSM"""
+
+    def __init__(self, registry: TextCommandRegistry):
+        self.registry = registry
+
+    async def __call__(self, message: Message, raw_state: str | None = None) -> bool | dict:
+        if raw_state is not None or not message.text:
+            return False
+        command = self.registry.get(message.text)
+        if command is None:
+            return False
+        return {"text_command": command}
+
+text_command = TextCommandRegistry()
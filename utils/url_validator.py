@@ -77,4 +77,17 @@ def get_url_display_name(url: str) -> str:
         else:
             return "Ссылка"
     except:
-        return "Ссылка"
\ No newline at end of file
+        return "Ссылка"
+
+def normalize_button_url(url: str) -> tuple:
+    """
+    Нормализация ссылки кастомной кнопки при сохранении
+    
+    Args:
+        url: исходный URL
+        
+    Returns:
+        tuple: (исправленный URL, валиден ли он, отображаемое имя)
+    """
+    fixed_url = validate_and_fix_url(url)
+    return fixed_url, is_valid_url(fixed_url), get_url_display_name(fixed_url)